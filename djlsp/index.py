@@ -1,6 +1,23 @@
 from dataclasses import dataclass, field
 
 
+def split_source(source: str) -> tuple[str, str, int] | None:
+    """
+    Split collector source reference (`<location>:<path>[:<line>]`) into
+    location, path and line.
+    """
+    try:
+        parts = source.split(":") if source else []
+        if len(parts) == 3:
+            return parts[0], parts[1], int(parts[2])
+        elif len(parts) == 2:
+            return parts[0], parts[1], 0
+    except (AttributeError, ValueError, IndexError):
+        # Malformed reference, only loses the goto definition
+        pass
+    return None
+
+
 @dataclass
 class Template:
     name: str = ""
@@ -8,6 +25,12 @@ class Template:
     extends: str | None = None
     blocks: list[str] | None = None
     context: dict = field(default_factory=dict)
+    path_parts: tuple[str, str, int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.path_parts = split_source(self.path)
 
 
 @dataclass
@@ -15,6 +38,12 @@ class Url:
     name: str = ""
     docs: str = ""
     source: str = ""
+    source_parts: tuple[str, str, int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.source_parts = split_source(self.source)
 
 
 @dataclass
@@ -24,6 +53,12 @@ class Tag:
     source: str = ""
     inner_tags: list[str] = ""
     closing_tag: str = ""
+    source_parts: tuple[str, str, int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.source_parts = split_source(self.source)
 
 
 @dataclass
@@ -31,6 +66,12 @@ class Filter:
     name: str = ""
     docs: str = ""
     source: str = ""
+    source_parts: tuple[str, str, int] | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        self.source_parts = split_source(self.source)
 
 
 @dataclass
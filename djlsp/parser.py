@@ -1,6 +1,8 @@
 import logging
 import re
-from functools import cached_property
+from collections import ChainMap
+from functools import cached_property, lru_cache
+from pathlib import Path
 from re import Match
 from textwrap import dedent
 
@@ -14,7 +16,114 @@ from djlsp.index import WorkspaceIndex
 logger = logging.getLogger(__name__)
 
 
+JEDI_FORLOOP_DECLARATION = dedent(
+    """
+    class DummyForLoop:
+        counter: int
+        counter0: int
+        revcounter: int
+        revcounter0: int
+        first: bool
+        last: bool
+        parentloop: "DummyForLoop"
+    forloop: DummyForLoop
+    """
+)
+
+
+@lru_cache(maxsize=1024)
+def get_jedi_declaration(variable: str, variable_type: str | None) -> str:
+    """
+    Python code that declares a single context variable for jedi.
+    """
+    if variable_type:
+        variable_import = variable_type.rpartition(".")[0]
+        return f"import {variable_import}\n{variable}: {variable_type}"
+    return f"{variable} = None"
+
+
+def _create_jedi_script(jedi_project: jedi.Project, prelude: str, code: str):
+    return jedi.Script(
+        code=f"{prelude}\n{code}" if prelude else code, project=jedi_project
+    )
+
+
+def _jedi_complete(jedi_project: jedi.Project, prelude: str, code: str):
+    return tuple(
+        (comp.name, comp.type)
+        for comp in _create_jedi_script(jedi_project, prelude, code).complete()
+    )
+
+
+def _jedi_goto(jedi_project: jedi.Project, prelude: str, code: str, column: int):
+    if gotos := _create_jedi_script(jedi_project, prelude, code).goto(column=column):
+        goto = gotos[0]
+        if goto.module_name == "__main__":
+            # Location is in fake script get type location
+            if infers := goto.infer():
+                goto = infers[0]
+            else:
+                return None
+        return (goto.module_path, goto.line, goto.column)
+    return None
+
+
+class ContextPrefixMatcher:
+    r"""
+    Match the (dotted) variable before the cursor inside `{{` or `{% tag `.
+
+    Gives the same groups as `.*({{|{% \w+ ).*?([\w\d_\.]*)$` (only group 2 is
+    used), but scans the line fragment from the right instead of backtracking
+    over the whole line.
+    """
+
+    re_tag_opener = re.compile(r"{% \w+ ")
+    re_prefix = re.compile(r"()([\w\d_\.]*)$")
+
+    def match(self, line_fragment: str) -> Match | None:
+        start = len(line_fragment)
+        while start and (
+            line_fragment[start - 1].isalnum() or line_fragment[start - 1] in "_."
+        ):
+            start -= 1
+
+        head = line_fragment[:start]
+        if "{{" in head or self.re_tag_opener.search(head):
+            return self.re_prefix.match(line_fragment, start)
+        return None
+
+
 class TemplateParser:
+    # Template scanning
+    re_loaded = re.compile(r".*{% ?load ([\w ]*) ?%}$")
+    re_as = re.compile(r".*{%.*as ([\w ]+) %}")
+    re_for = re.compile(r".*{% ?for ([\w ,]*) in")
+    re_for_tag = re.compile(r"{% ?for ")
+    re_with = re.compile(r".*{% ?with (.+) ?%}")
+    re_type = re.compile(r".*{# type (\w+) ?: ?([\w\d_\.]+) ?#}")
+    re_block = re.compile(r"{% *block ([\w]*) *%}")
+    re_tag_name = re.compile(r"{% ?(\w+).*?%}")
+
+    # Line fragment (text before cursor) matchers
+    re_load_completion = re.compile(r".*{% ?load ([\w ]*)$")
+    re_block_completion = re.compile(r".*{% ?block ([\w]*)$")
+    re_endblock_completion = re.compile(r".*{% ?endblock ([\w]*)$")
+    re_url = re.compile(r""".*{% ?url ('|")([\w\-:]*)$""")
+    re_static_completion = re.compile(r".*{% ?static ('|\")([\w\-\.\/]*)$")
+    re_template_completion = re.compile(r""".*{% ?(extends|include) ('|")([\w\-:]*)$""")
+    re_template_definition = re.compile(
+        r""".*{% ?(extends|include) ('|")([\w\-\./]*)$"""
+    )
+    re_tag = re.compile(r"^.*{% ?(\w*)$")
+    re_filter = re.compile(r"^.*({%|{{).*?\|(\w*)$")
+    re_filter_hover = re.compile(r"^.*({%|{{) ?[\w \.\|]*\|(\w*)$")
+    re_type_completion = re.compile(r"^.*{# type \w+ ?: ?([\w\d_\.]*)$")
+    context_matcher = ContextPrefixMatcher()
+
+    # Line remainder (text after cursor) matchers
+    re_name_after = re.compile(r"([\w\d]+)")
+    re_url_name_after = re.compile(r"([\w\d:\-]+)")
+    re_template_name_after = re.compile(r"""([^'"]*)['"]""")
 
     def __init__(
         self,
@@ -26,12 +135,16 @@ class TemplateParser:
         self.jedi_project: jedi.Project = jedi_project
         self.document: TextDocument = document
 
+    @cached_property
+    def lines(self) -> list[str]:
+        # pygls splits the whole source on every `document.lines` access
+        return self.document.lines
+
     @cached_property
     def loaded_libraries(self):
-        re_loaded = re.compile(r".*{% ?load ([\w ]*) ?%}$")
         loaded = {BUILTIN}
-        for line in self.document.lines:
-            if match := re_loaded.match(line):
+        for line in self.lines:
+            if match := self.re_loaded.match(line):
                 loaded.update(
                     [
                         lib
@@ -44,25 +157,24 @@ class TemplateParser:
 
     @cached_property
     def context(self):
-        context = self.workspace_index.global_template_context.copy()
+        # Overlay the index context dicts instead of copying them, variables
+        # found in the document are only added to the first (local) mapping.
+        context = ChainMap({}, self.workspace_index.global_template_context)
         if "/templates/" in self.document.path:
             template_name = self.document.path.split("/templates/", 1)[1]
             if template := self.workspace_index.templates.get(template_name):
-                context.update(template.context)
+                context.maps.insert(1, template.context)
 
         # Add all variables found in template to context
         # TODO: Use scope to only add to context based on cursor position
-        re_as = re.compile(r".*{%.*as ([\w ]+) %}.*$")
-        re_for = re.compile(r".*{% ?for ([\w ,]*) in.*$")
-        re_with = re.compile(r".*{% ?with (.+) ?%}.*")
         found_variables = []
-        for line in self.document.lines:
-            if match := re_as.match(line):
+        for line in self.lines:
+            if match := self.re_as.match(line):
                 found_variables.extend(match.group(1).split(" "))
-            if match := re_for.match(line):
+            if match := self.re_for.match(line):
                 context["forloop"] = None
                 found_variables.extend(match.group(1).split(","))
-            if match := re_with.match(line):
+            if match := self.re_with.match(line):
                 for assignment in match.group(1).split(" "):
                     split_assignment = assignment.split("=")
                     if len(split_assignment) == 2:
@@ -75,94 +187,86 @@ class TemplateParser:
         # Update type definations based on template type comments
         # only simple version of variable: full python path:
         # {# type some_variable: full.python.path.to.class #}
-        re_type = re.compile(r".*{# type (\w+) ?: ?([\w\d_\.]+) ?#}.*")
-        for line in self.document.lines:
-            if match := re_type.match(line):
+        for line in self.lines:
+            if match := self.re_type.match(line):
                 variable = match.group(1)
                 variable_type = match.group(2)
                 context[variable] = variable_type
 
         return context
 
-    def create_jedi_script(self, code) -> jedi.Script:
+    @cached_property
+    def script_prelude(self) -> str:
         """
-        Generate jedi Script based on template context and given code.
+        Python code that declares the template context for jedi.
         """
         script_lines = []
-        if re.search(r"{% ?for ", self.document.source):
+        if self.re_for_tag.search(self.document.source):
             # TODO: Only add in for scope
-            script_lines.append(
-                dedent(
-                    """
-                    class DummyForLoop:
-                        counter: int
-                        counter0: int
-                        revcounter: int
-                        revcounter0: int
-                        first: bool
-                        last: bool
-                        parentloop: "DummyForLoop"
-                    forloop: DummyForLoop
-                    """
-                )
-            )
+            script_lines.append(JEDI_FORLOOP_DECLARATION)
         for variable, variable_type in self.context.items():
-            if variable_type:
-                variable_import = ".".join(variable_type.split(".")[:-1])
-                script_lines.extend(
-                    [
-                        f"import {variable_import}",
-                        f"{variable}: {variable_type}",
-                    ]
-                )
-            else:
-                script_lines.append(f"{variable} = None")
+            script_lines.append(get_jedi_declaration(variable, variable_type))
+        return "\n".join(script_lines)
 
-        # Add user code
-        script_lines.append(code)
+    def create_jedi_script(self, code) -> jedi.Script:
+        """
+        Generate jedi Script based on template context and given code.
+        """
+        return _create_jedi_script(self.jedi_project, self.script_prelude, code)
+
+    @cached_property
+    def jedi_results(self) -> dict:
+        # Only cached for this parser (document version), jedi itself tracks
+        # changes of the project python files between versions.
+        return {}
 
-        return jedi.Script(code="\n".join(script_lines), project=self.jedi_project)
+    def jedi_complete(self, code) -> tuple[tuple[str, str], ...]:
+        """
+        Jedi completions as (name, type) pairs.
+        """
+        key = ("complete", code)
+        if key not in self.jedi_results:
+            self.jedi_results[key] = _jedi_complete(
+                self.jedi_project, self.script_prelude, code
+            )
+        return self.jedi_results[key]
+
+    def jedi_goto(self, code, column) -> tuple[Path, int, int] | None:
+        """
+        Jedi goto location as (module_path, line, column).
+        """
+        key = ("goto", code, column)
+        if key not in self.jedi_results:
+            self.jedi_results[key] = _jedi_goto(
+                self.jedi_project, self.script_prelude, code, column
+            )
+        return self.jedi_results[key]
 
     ###################################################################################
     # Completions
     ###################################################################################
+    @cached_property
+    def completion_results(self) -> dict[tuple[int, int], list[CompletionItem]]:
+        # Parser is reused for the same document version, clients can request
+        # completions for the same position multiple times.
+        return {}
+
     def completions(self, line, character):
-        line_fragment = self.document.lines[line][:character]
-        matchers = [
-            (re.compile(r".*{% ?load ([\w ]*)$"), self.get_load_completions),
-            (re.compile(r".*{% ?block ([\w]*)$"), self.get_block_completions),
-            (re.compile(r".*{% ?endblock ([\w]*)$"), self.get_endblock_completions),
-            (re.compile(r""".*{% ?url ('|")([\w\-:]*)$"""), self.get_url_completions),
-            (
-                re.compile(r".*{% ?static ('|\")([\w\-\.\/]*)$"),
-                self.get_static_completions,
-            ),
-            (
-                re.compile(r""".*{% ?(extends|include) ('|")([\w\-:]*)$"""),
-                self.get_template_completions,
-            ),
-            (re.compile(r"^.*{% ?(\w*)$"), self.get_tag_completions),
-            (
-                re.compile(r"^.*({%|{{).*?\|(\w*)$"),
-                self.get_filter_completions,
-            ),
-            (
-                re.compile(r"^.*{# type \w+ ?: ?([\w\d_\.]*)$"),
-                self.get_type_comment_complations,
-            ),
-            (
-                re.compile(r".*({{|{% \w+ ).*?([\w\d_\.]*)$"),
-                self.get_context_completions,
-            ),
-        ]
+        if (line, character) not in self.completion_results:
+            self.completion_results[line, character] = self._completions(
+                line, character
+            )
+        return self.completion_results[line, character]
 
-        for regex, completion in matchers:
+    def _completions(self, line, character):
+        line_fragment = self.lines[line][:character]
+        for regex, completion in self.completion_matchers:
             if match := regex.match(line_fragment):
                 # Sort completions because some editors (Helix) will use order
                 # as is and wont use sort_text.
                 return list(
                     sorted(
-                        completion(match, line=line, character=character),
+                        completion(self, match, line=line, character=character),
                         key=lambda comp: (
                             comp.sort_text if comp.sort_text else comp.label
                         ),
@@ -175,7 +279,7 @@ class TemplateParser:
         logger.debug(f"Find load matches for: {prefix}")
         return [
             CompletionItem(label=lib)
-            for lib in self.workspace_index.libraries.keys()
+            for lib in self.workspace_index.libraries
             if lib != BUILTIN and lib.startswith(prefix)
         ]
 
@@ -189,9 +293,8 @@ class TemplateParser:
                 block_names = self._recursive_block_names(template.extends)
 
         used_block_names = []
-        re_block = re.compile(r"{% *block ([\w]*) *%}")
-        for line in self.document.lines:
-            if matches := re_block.findall(line):
+        for line in self.lines:
+            if matches := self.re_block.findall(line):
                 used_block_names.extend(matches)
 
         return [
@@ -205,9 +308,8 @@ class TemplateParser:
         logger.debug(f"Find endblock matches for: {prefix}")
         items = {}
 
-        re_block = re.compile(r"{% *block ([\w]*) *%}")
-        for text_line in self.document.lines[:line]:
-            if matches := re_block.findall(text_line):
+        for text_line in self.lines[:line]:
+            if matches := self.re_block.findall(text_line):
                 for name in reversed(matches):
                     items.setdefault(
                         name,
@@ -271,30 +373,30 @@ class TemplateParser:
 
         # Collect all tags above the current cursor position
         collected_tags = []
-        tag_re = re.compile(r"{% ?(\w+).*?%}")
-        for text_line in self.document.lines[:line]:
-            for tag_name in tag_re.findall(text_line):
+        for text_line in self.lines[:line]:
+            for tag_name in self.re_tag_name.findall(text_line):
                 if tag := available_tags.get(tag_name):
                     collected_tags.append(tag)
 
-        # Add all tag completions
+        # Add all tag completions (filter on name before creating items)
         tags = {}
         for tag in available_tags.values():
-            tags[tag.name] = CompletionItem(
-                label=tag.name,
-                documentation=tag.docs,
-                sort_text=f"999: {tag.name}",
-            )
+            if tag.name.startswith(prefix):
+                tags[tag.name] = CompletionItem(
+                    label=tag.name,
+                    documentation=tag.docs,
+                    sort_text=f"999: {tag.name}",
+                )
 
         # Add all inner/closing tags
         for index, tag in enumerate(reversed(collected_tags)):
             for tag_name in filter(None, [*tag.inner_tags, tag.closing_tag]):
-                tags.setdefault(
-                    tag_name,
-                    CompletionItem(label=tag_name, sort_text=f"{index}: {tag_name}"),
-                )
+                if tag_name.startswith(prefix) and tag_name not in tags:
+                    tags[tag_name] = CompletionItem(
+                        label=tag_name, sort_text=f"{index}: {tag_name}"
+                    )
 
-        return [tag for tag in tags.values() if tag.label.startswith(prefix)]
+        return list(tags.values())
 
     def get_filter_completions(self, match: Match, **kwargs):
         prefix = match.group(2)
@@ -309,44 +411,37 @@ class TemplateParser:
                             documentation=filt.docs,
                         )
                         for filt in lib.filters.values()
+                        if filt.name.startswith(prefix)
                     ]
                 )
-        return [
-            filter_name
-            for filter_name in filters
-            if filter_name.label.startswith(prefix)
-        ]
+        return filters
 
     def get_type_comment_complations(self, match: Match, **kwargs):
         prefix = match.group(1)
         logger.debug(f"Find type comment matches for: {prefix}")
 
         if "." in prefix:
-            from_part = ".".join(prefix.split(".")[:-1])
-            import_part = prefix.split(".")[-1]
+            from_part, _, import_part = prefix.rpartition(".")
             code = f"from {from_part} import {import_part}"
         else:
             code = f"import {prefix}"
 
-        return [
-            CompletionItem(label=comp.name)
-            for comp in self.create_jedi_script(code).complete()
-        ]
+        return [CompletionItem(label=name) for name, _ in self.jedi_complete(code)]
 
     def get_context_completions(self, match: Match, **kwargs):
         prefix = match.group(2)
         logger.debug(f"Find context matches for: {prefix}")
 
-        def get_sort_text(comp):
-            type_sort = {"statement": "1", "property": "2"}.get(comp.type, "9")
-            return f"{type_sort}-{comp.name}".lower()
+        def get_sort_text(name, type_):
+            type_sort = {"statement": "1", "property": "2"}.get(type_, "9")
+            return f"{type_sort}-{name}".lower()
 
         if "." in prefix:
             # Find . completions with Jedi
             return [
-                CompletionItem(label=comp.name, sort_text=get_sort_text(comp))
-                for comp in self.create_jedi_script(prefix).complete()
-                if not comp.name.startswith("_")
+                CompletionItem(label=name, sort_text=get_sort_text(name, type_))
+                for name, type_ in self.jedi_complete(prefix)
+                if not name.startswith("_")
             ]
         else:
             # Only context completions
@@ -360,20 +455,15 @@ class TemplateParser:
     # Hover
     ###################################################################################
     def hover(self, line, character):
-        line_fragment = self.document.lines[line][:character]
-        matchers = [
-            (re.compile(r""".*{% ?url ('|")([\w\-:]*)$"""), self.get_url_hover),
-            (re.compile(r"^.*({%|{{) ?[\w \.\|]*\|(\w*)$"), self.get_filter_hover),
-            (re.compile(r"^.*{% ?(\w*)$"), self.get_tag_hover),
-        ]
-        for regex, hover in matchers:
+        line_fragment = self.lines[line][:character]
+        for regex, hover in self.hover_matchers:
             if match := regex.match(line_fragment):
-                return hover(line, character, match)
+                return hover(self, line, character, match)
         return None
 
     def get_url_hover(self, line, character, match: Match):
         full_match = self._get_full_hover_name(
-            line, character, match.group(2), regex=r"^([\w\d:\-]+).*"
+            line, character, match.group(2), regex=self.re_url_name_after
         )
         logger.debug(f"Find url hover for: {full_match}")
         if url := self.workspace_index.urls.get(full_match):
@@ -401,8 +491,9 @@ class TemplateParser:
                 )
         return None
 
-    def _get_full_hover_name(self, line, character, first_part, regex=r"^([\w\d]+).*"):
-        if match_after := re.match(regex, self.document.lines[line][character:]):
+    def _get_full_hover_name(self, line, character, first_part, regex=None):
+        regex = regex or self.re_name_after
+        if match_after := regex.match(self.lines[line][character:]):
             return first_part + match_after.group(1)
         return first_part
 
@@ -410,23 +501,10 @@ class TemplateParser:
     # Goto definition
     ###################################################################################
     def goto_definition(self, line, character):
-        line_fragment = self.document.lines[line][:character]
-        matchers = [
-            (
-                re.compile(r""".*{% ?(extends|include) ('|")([\w\-\./]*)$"""),
-                self.get_template_definition,
-            ),
-            (re.compile(r""".*{% ?url ('|")([\w\-:]*)$"""), self.get_url_definition),
-            (re.compile(r"^.*{% ?(\w*)$"), self.get_tag_definition),
-            (re.compile(r"^.*({%|{{).*?\|(\w*)$"), self.get_filter_definition),
-            (
-                re.compile(r".*({{|{% \w+ ).*?([\w\d_\.]*)$"),
-                self.get_context_definition,
-            ),
-        ]
-        for regex, definition in matchers:
+        line_fragment = self.lines[line][:character]
+        for regex, definition in self.goto_definition_matchers:
             if match := regex.match(line_fragment):
-                return definition(line, character, match)
+                return definition(self, line, character, match)
         return None
 
     def create_location(self, location, path, line):
@@ -438,67 +516,92 @@ class TemplateParser:
         return Location(
             uri=f"file://{root_path}/{path}",
             range=Range(
-                start=Position(line=int(line), character=0),
-                end=Position(line=int(line), character=0),
+                start=Position(line=line, character=0),
+                end=Position(line=line, character=0),
             ),
         )
 
     def get_template_definition(self, line, character, match: Match):
-        if match_after := re.match(r'^(.*)".*', self.document.lines[line][character:]):
+        if match_after := self.re_template_name_after.match(
+            self.lines[line][character:]
+        ):
             template_name = match.group(3) + match_after.group(1)
             logger.debug(f"Find template goto definition for: {template_name}")
             if template := self.workspace_index.templates.get(template_name):
-                location, path = template.path.split(":")
-                return self.create_location(location, path, 0)
+                if template.path_parts:
+                    return self.create_location(*template.path_parts)
 
     def get_url_definition(self, line, character, match: Match):
         full_match = self._get_full_definition_name(
-            line, character, match.group(2), regex=r"^([\w\d:\-]+).*"
+            line, character, match.group(2), regex=self.re_url_name_after
         )
         logger.debug(f"Find url goto definition for: {full_match}")
         if url := self.workspace_index.urls.get(full_match):
-            if url.source:
-                return self.create_location(*url.source.split(":"))
+            if url.source_parts:
+                return self.create_location(*url.source_parts)
 
     def get_tag_definition(self, line, character, match: Match):
         full_match = self._get_full_definition_name(line, character, match.group(1))
         logger.debug(f"Find tag goto definition for: {full_match}")
         for lib in self.loaded_libraries:
             if tag := self.workspace_index.libraries[lib].tags.get(full_match):
-                if tag.source:
-                    return self.create_location(*tag.source.split(":"))
+                if tag.source_parts:
+                    return self.create_location(*tag.source_parts)
 
     def get_filter_definition(self, line, character, match: Match):
         full_match = self._get_full_definition_name(line, character, match.group(2))
         logger.debug(f"Find filter goto definition for: {full_match}")
         for lib in self.loaded_libraries:
             if filter_ := self.workspace_index.libraries[lib].filters.get(full_match):
-                if filter_.source:
-                    return self.create_location(*filter_.source.split(":"))
+                if filter_.source_parts:
+                    return self.create_location(*filter_.source_parts)
 
     def get_context_definition(self, line, character, match: Match):
         first_match = match.group(2)
         full_match = self._get_full_definition_name(line, character, first_match)
         logger.debug(f"Find context goto definition for: {full_match}")
-        if gotos := self.create_jedi_script(full_match).goto(column=len(first_match)):
-            goto = gotos[0]
-            if goto.module_name == "__main__":
-                # Location is in fake script get type location
-                if infers := goto.infer():
-                    goto = infers[0]
-                else:
-                    return None
+        if goto := self.jedi_goto(full_match, len(first_match)):
+            module_path, goto_line, goto_column = goto
             return Location(
-                uri=f"file://{goto.module_path}",
+                uri=f"file://{module_path}",
                 range=Range(
-                    start=Position(line=goto.line, character=goto.column),
-                    end=Position(line=goto.line, character=goto.column),
+                    start=Position(line=goto_line, character=goto_column),
+                    end=Position(line=goto_line, character=goto_column),
                 ),
             )
 
-    def _get_full_definition_name(
-        self, line, character, first_part, regex=r"^([\w\d]+).*"
-    ):
-        if match_after := re.match(regex, self.document.lines[line][character:]):
+    def _get_full_definition_name(self, line, character, first_part, regex=None):
+        regex = regex or self.re_name_after
+        if match_after := regex.match(self.lines[line][character:]):
             return first_part + match_after.group(1)
         return first_part
+
+    ###################################################################################
+    # Matchers: (line fragment matcher, handler), first match wins
+    ###################################################################################
+    completion_matchers = (
+        (re_load_completion, get_load_completions),
+        (re_block_completion, get_block_completions),
+        (re_endblock_completion, get_endblock_completions),
+        (re_url, get_url_completions),
+        (re_static_completion, get_static_completions),
+        (re_template_completion, get_template_completions),
+        (re_tag, get_tag_completions),
+        (re_filter, get_filter_completions),
+        (re_type_completion, get_type_comment_complations),
+        (context_matcher, get_context_completions),
+    )
+
+    hover_matchers = (
+        (re_url, get_url_hover),
+        (re_filter_hover, get_filter_hover),
+        (re_tag, get_tag_hover),
+    )
+
+    goto_definition_matchers = (
+        (re_template_definition, get_template_definition),
+        (re_url, get_url_definition),
+        (re_tag, get_tag_definition),
+        (re_filter, get_filter_definition),
+        (context_matcher, get_context_definition),
+    )
@@ -1,19 +1,29 @@
 import argparse
 import importlib
+import importlib.util
 import inspect
+import io
 import json
 import logging
 import os
+import pkgutil
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from unittest.mock import MagicMock, patch
+from functools import cached_property
+from types import SimpleNamespace
+from unittest.mock import patch
 
 import django
 from django.apps import apps
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.contrib.staticfiles.finders import get_finders
+from django.contrib.staticfiles.finders import (
+    AppDirectoriesFinder,
+    FileSystemFinder,
+    get_finders,
+)
 from django.template.backends.django import get_installed_libraries
 from django.template.engine import Engine
 from django.template.library import InvalidTemplateLibrary
@@ -101,6 +111,16 @@ LIBRARIES_NODE_TAGS = {
     },
 }
 
+# Flat (library name, tag name) lookup of the node tags
+NODE_TAG_INDEX = {
+    (lib_name, tag): {
+        "inner_tags": options.get("inner_tags", []),
+        "closing_tag": options.get("closing_tag"),
+    }
+    for lib_name, tags in LIBRARIES_NODE_TAGS.items()
+    for tag, options in tags.items()
+}
+
 # Context processors are functions and therefore hard to parse
 # Use hardcoded mapping for know context processors.
 TEMPLATE_CONTEXT_PROCESSORS = {
@@ -169,6 +189,17 @@ TEMPLATE_CONTEXT_PROCESSORS = {
 }
 
 
+# Directories that are not walked when looking for templates
+TEMPLATE_SKIP_DIRECTORIES = {
+    ".git",
+    ".hg",
+    ".svn",
+    "__pycache__",
+    "node_modules",
+    ".venv",
+}
+
+
 #######################################################################################
 # Index Types
 #######################################################################################
@@ -183,11 +214,18 @@ class Template:
 # Index collector
 #######################################################################################
 class DjangoIndexCollector:
-    re_extends = re.compile(r""".*{% ?extends ['"](.*)['"] ?%}.*""")
-    re_block = re.compile(r".*{% ?block (\w*) ?%}.*")
+    # Single pass over the template content for both extends and block tags
+    re_template_tags = re.compile(
+        r"""{%\s*(extends|block)\s+(?:['"]([^'"]+)['"]|(\w+))\s*%}"""
+    )
 
     def __init__(self, project_src_path):
         self.project_src_path = project_src_path
+        self.src_prefix = project_src_path.rstrip("/") + "/"
+        self.env_prefix = sys.prefix.rstrip("/") + "/"
+        # Source references by object id, the same callables (views, tags,
+        # filters) are seen multiple times during a collect.
+        self._source_cache: dict[int, str] = {}
 
         # Index data
         self.file_watcher_globs = []
@@ -197,19 +235,55 @@ class DjangoIndexCollector:
         self.templates: dict[str, Template] = {}
         self.global_template_context = {}
 
+    @cached_property
+    def engine(self):
+        return Engine.get_default()
+
+    @cached_property
+    def templates_dirs(self):
+        """
+        Template directories in loader order, the same (physical) directory can
+        be configured multiple times but is only included once.
+        """
+        templates_dirs = {}
+        for templates_dir in [
+            *self.engine.dirs,
+            *get_app_template_dirs("templates"),
+        ]:
+            templates_dirs.setdefault(os.path.realpath(templates_dir), templates_dir)
+        return list(templates_dirs.values())
+
+    @cached_property
+    def app_configs(self):
+        return tuple(apps.get_app_configs())
+
+    @cached_property
+    def models(self):
+        return tuple(apps.get_models())
+
     def collect(self):
         self.file_watcher_globs = self.get_file_watcher_globs()
-        self.static_files = self.get_static_files()
-        self.templates = self.get_templates()
+
+        # Independent collectors (file system walks and imports), run them in
+        # threads. Django is set up, so they only read from the app registry.
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            static_files = executor.submit(self.get_static_files)
+            templates = executor.submit(self.get_templates)
+            libraries = executor.submit(self.get_libraries)
+            global_template_context = executor.submit(self.get_global_template_context)
+            self.static_files = static_files.result()
+            self.templates = templates.result()
+            self.libraries = libraries.result()
+            self.global_template_context = global_template_context.result()
+
+        # Urls add view context to the collected templates
         self.urls = self.get_urls()
-        self.libraries = self.get_libraries()
-        self.global_template_context = self.get_global_template_context()
 
         # Third party collectors
         self.collect_for_wagtail()
 
-    def to_json(self):
-        return json.dumps(
+    def write_json(self, fp, pretty=False):
+        json.dump(
             {
                 "file_watcher_globs": self.file_watcher_globs,
                 "static_files": self.static_files,
@@ -218,35 +292,84 @@ class DjangoIndexCollector:
                 "templates": self.templates,
                 "global_template_context": self.global_template_context,
             },
-            indent=4,
+            fp,
+            # Output is read by the LSP server, only indent for debugging
+            indent=4 if pretty else None,
+            separators=None if pretty else (",", ":"),
+            ensure_ascii=False,
         )
 
     def get_source_from_type(self, type_):
-        def unwrap(func):
-            while hasattr(func, "__wrapped__"):
-                func = func.__wrapped__
-            return func
-
-        type_ = unwrap(type_)
+        key = id(type_)
+        if key not in self._source_cache:
+            self._source_cache[key] = self._get_source_from_type(type_)
+        return self._source_cache[key]
 
+    def _get_source_from_type(self, type_):
         try:
+            type_ = inspect.unwrap(type_)
             source_file = inspect.getsourcefile(type_)
             line = inspect.getsourcelines(type_)[1]
         except Exception as e:
             logger.error(e)
             return ""
 
-        if source_file.startswith(self.project_src_path):
-            path = source_file.removeprefix(self.project_src_path).lstrip("/")
-            return f"src:{path}:{line}"
-        elif source_file.startswith(sys.prefix):
-            path = source_file.removeprefix(sys.prefix).lstrip("/")
-            return f"env:{path}:{line}"
+        if path := self.get_path_reference(source_file):
+            return f"{path}:{line}"
+        return ""
+
+    def get_path_reference(self, path):
+        """Path as `src:<relative path>` or `env:<relative path>`"""
+        if path.startswith(self.src_prefix):
+            return f"src:{path[len(self.src_prefix):]}"
+        elif path.startswith(self.env_prefix):
+            return f"env:{path[len(self.env_prefix):]}"
         return ""
 
     def get_type_full_name(self, type_):
         return f"{type_.__module__}.{type_.__name__}"
 
+    def _scandir_files(self, root, skip_directories=(), follow_symlinks=False):
+        """
+        Recursively yield (path, relative path) for all files in root.
+
+        Uses os.scandir so file types come from the directory listing instead of
+        an extra stat call per entry. Directories named in `skip_directories`
+        are not entered. With `follow_symlinks` symlinked directories are walked
+        as well (each real directory only once, to stop symlink cycles).
+        """
+        visited = {os.path.realpath(root)} if follow_symlinks else None
+        stack = [(root, "")]
+        while stack:
+            path, relative_root = stack.pop()
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        relative_path = f"{relative_root}{entry.name}"
+                        if entry.is_dir(follow_symlinks=follow_symlinks):
+                            if entry.name in skip_directories:
+                                continue
+                            if follow_symlinks:
+                                real_path = os.path.realpath(entry.path)
+                                if real_path in visited:
+                                    continue
+                                visited.add(real_path)
+                            stack.append((entry.path, f"{relative_path}/"))
+                        elif entry.is_file():
+                            yield entry.path, relative_path
+            except OSError:
+                continue
+
+    def _get_module_names(self, package):
+        """Public (non package) module names of given package"""
+        return [
+            name
+            for _, name, is_package in pkgutil.iter_modules(
+                getattr(package, "__path__", [])
+            )
+            if not is_package and name[0] != "_"
+        ]
+
     # File watcher globs
     # ---------------------------------------------------------------------------------
     def get_file_watcher_globs(self):
@@ -266,10 +389,7 @@ class DjangoIndexCollector:
             if static_folder != "static":
                 patterns.append(f"**/{static_folder}/**")
 
-        for template_path in [
-            *Engine.get_default().dirs,
-            *get_app_template_dirs("templates"),
-        ]:
+        for template_path in self.templates_dirs:
             template_folder = os.path.basename(template_path)
             if template_folder != "templates":
                 patterns.append(f"**/{template_folder}/**")
@@ -281,11 +401,28 @@ class DjangoIndexCollector:
     def get_static_files(self):
         # TODO: Add option to ignore some static folders
         # (like static that is generated with a JS bundler)
-        static_paths = []
+        static_paths = {}
         for finder in get_finders():
-            for path, _ in finder.list(None):
-                static_paths.append(path)
-        return static_paths
+            if isinstance(finder, FileSystemFinder):
+                roots = [root for _, root in finder.locations]
+            elif isinstance(finder, AppDirectoriesFinder):
+                roots = [storage.location for storage in finder.storages.values()]
+            else:
+                # Unknown finder, use its own (storage based) listing
+                static_paths.update(
+                    dict.fromkeys(path for path, _ in finder.list(None))
+                )
+                continue
+
+            for root in roots:
+                static_paths.update(
+                    # Static storages follow symlinked directories
+                    dict.fromkeys(
+                        path
+                        for _, path in self._scandir_files(root, follow_symlinks=True)
+                    )
+                )
+        return list(static_paths)
 
     # Urls
     # ---------------------------------------------------------------------------------
@@ -295,47 +432,50 @@ class DjangoIndexCollector:
         except Exception:
             return {}
 
-        def recursive_get_views(urlpatterns, namespace=None, pattern=""):
-            views = {}
-            for p in urlpatterns:
-                if isinstance(p, URLPattern):
-                    # TODO: Get view path/line and template context
-                    if not p.name:
-                        name = p.name
-                    elif namespace:
-                        name = "{0}:{1}".format(namespace, p.name)
-                    else:
-                        name = p.name
-
-                    if name:
-                        callback = getattr(p.callback, "view_class", p.callback)
-                        try:
-                            self.add_template_context_for_view(callback)
-                        except Exception:
-                            pass
-                        views[name] = {
-                            "docs": f"{pattern}{p.pattern}",
-                            "source": self.get_source_from_type(callback),
-                        }
-                elif isinstance(p, URLResolver):
-                    try:
-                        patterns = p.url_patterns
-                    except ImportError:
-                        continue
-                    if namespace and p.namespace:
-                        _namespace = "{0}:{1}".format(namespace, p.namespace)
-                    else:
-                        _namespace = p.namespace or namespace
-                    views.update(
-                        recursive_get_views(
-                            patterns,
-                            namespace=_namespace,
-                            pattern=f"{pattern}{p.pattern}",
-                        )
-                    )
-            return views
+        # Walk url tree depth first with an explicit stack of
+        # (patterns iterator, namespace, pattern prefix), keeping url order.
+        views = {}
+        stack = [(iter(urlpatterns), None, "")]
+        while stack:
+            patterns, namespace, pattern = stack[-1]
+            p = next(patterns, None)
+            if p is None:
+                stack.pop()
+                continue
 
-        return recursive_get_views(urlpatterns)
+            # Fast exact type check, isinstance only for (rare) subclasses
+            p_type = type(p)
+            if p_type is URLPattern or (
+                p_type is not URLResolver and isinstance(p, URLPattern)
+            ):
+                # TODO: Get view path/line and template context
+                if not p.name:
+                    # Unnamed urls can't be used in templates
+                    continue
+                name = f"{namespace}:{p.name}" if namespace else p.name
+
+                callback = getattr(p.callback, "view_class", p.callback)
+                try:
+                    self.add_template_context_for_view(callback)
+                except Exception:
+                    pass
+                views[name] = {
+                    "docs": f"{pattern}{p.pattern}",
+                    "source": self.get_source_from_type(callback),
+                }
+            elif p_type is URLResolver or isinstance(p, URLResolver):
+                try:
+                    sub_patterns = p.url_patterns
+                except ImportError:
+                    continue
+                if namespace and p.namespace:
+                    sub_namespace = "{0}:{1}".format(namespace, p.namespace)
+                else:
+                    sub_namespace = p.namespace or namespace
+                stack.append(
+                    (iter(sub_patterns), sub_namespace, f"{pattern}{p.pattern}")
+                )
+        return views
 
     # Libaries
     # ---------------------------------------------------------------------------------
@@ -347,78 +487,88 @@ class DjangoIndexCollector:
             }
         }
 
-        # Collect builtins
-        for lib_mod_path in Engine.get_default().builtins:
-            lib = importlib.import_module(lib_mod_path).register
-            parsed_lib = self._parse_library(lib)
-            libraries["__builtins__"]["tags"].update(parsed_lib["tags"])
-            libraries["__builtins__"]["filters"].update(parsed_lib["filters"])
+        try:
+            installed_libraries = get_installed_libraries()
+        except InvalidTemplateLibrary as e:
+            logger.error(f"Failed to get installed template libraries: {e}")
+            installed_libraries = {}
+        # Parsed libraries by (module path, library name), the same module can be
+        # found multiple times while looking through the apps.
+        parsed_libraries = {}
+
+        def parse_library(lib_mod_path, lib_name):
+            key = (lib_mod_path, lib_name)
+            if key not in parsed_libraries:
+                parsed_libraries[key] = self._parse_library(
+                    importlib.import_module(lib_mod_path).register, lib_name
+                )
+            return parsed_libraries[key]
+
+        # Collect builtins, merged in place (each module is only seen once here)
+        builtins = libraries["__builtins__"]
+        for lib_mod_path in self.engine.builtins:
+            parsed_lib = self._parse_library(
+                importlib.import_module(lib_mod_path).register, "__builtins__"
+            )
+            builtins["tags"] |= parsed_lib["tags"]
+            builtins["filters"] |= parsed_lib["filters"]
 
         # Get Django templatetags
-        django_path = inspect.getabsfile(django.templatetags)
-        django_mod_files = os.listdir(os.path.dirname(django_path))
-        for django_lib in [
-            i[:-3] for i in django_mod_files if i.endswith(".py") and i[0] != "_"
-        ]:
+        for django_lib in self._get_module_names(django.templatetags):
             try:
-                lib = get_installed_libraries()[django_lib]
-                lib = importlib.import_module(lib).register
-                libraries[django_lib] = self._parse_library(lib)
+                libraries[django_lib] = parse_library(
+                    installed_libraries[django_lib], django_lib
+                )
             except (InvalidTemplateLibrary, KeyError) as e:
                 logger.error(f"Failed to parse django templatetag {django_lib}: {e}")
                 continue
 
-        for app_config in apps.get_app_configs():
-            app = app_config.name
-            try:
-                templatetag_mod = __import__(app + ".templatetags", {}, {}, [""])
-            except ImportError:
-                continue
-
+        for app_config in self.app_configs:
+            templatetags_mod_path = f"{app_config.name}.templatetags"
             try:
-                mod_path = inspect.getabsfile(templatetag_mod)
-            except TypeError as e:
-                logger.error(f"Failed getting path for ({app}) templatetags: {e}")
+                # Most apps don't have templatetags, check without importing
+                if importlib.util.find_spec(templatetags_mod_path) is None:
+                    continue
+                templatetag_mod = importlib.import_module(templatetags_mod_path)
+            except (ImportError, ValueError):
                 continue
-            mod_files = os.listdir(os.path.dirname(mod_path))
-            tag_files = [i[:-3] for i in mod_files if i.endswith(".py") and i[0] != "_"]
 
-            for taglib in tag_files:
+            for taglib in self._get_module_names(templatetag_mod):
                 try:
-                    lib = get_installed_libraries()[taglib]
-                    lib = importlib.import_module(lib).register
+                    libraries[taglib] = parse_library(
+                        installed_libraries[taglib], taglib
+                    )
                 except (InvalidTemplateLibrary, KeyError) as e:
                     logger.error(f"Failed to parse library ({taglib}): {e}")
                     continue
 
-                libraries[taglib] = self._parse_library(lib)
+        return libraries
 
-        # Add node tags
-        for lib_name, tags in LIBRARIES_NODE_TAGS.items():
-            if lib_name in libraries:
-                for tag, options in tags.items():
-                    if tag in libraries[lib_name]["tags"]:
-                        libraries[lib_name]["tags"][tag]["inner_tags"] = options.get(
-                            "inner_tags", []
-                        )
-                        libraries[lib_name]["tags"][tag]["closing_tag"] = options.get(
-                            "closing_tag"
-                        )
+    def _parse_library(self, lib, lib_name) -> dict:
+        # Stripped docs by docstring id, tags and filters can share functions
+        # (and therefore docstrings).
+        docs_cache = {}
 
-        return libraries
+        def get_docs(func):
+            if not (doc := func.__doc__):
+                return ""
+            if (key := id(doc)) not in docs_cache:
+                docs_cache[key] = doc.strip()
+            return docs_cache[key]
 
-    def _parse_library(self, lib) -> dict:
         return {
             "tags": {
                 name: {
-                    "docs": func.__doc__.strip() if func.__doc__ else "",
+                    "docs": get_docs(func),
                     "source": self.get_source_from_type(func),
+                    # Add node tags
+                    **NODE_TAG_INDEX.get((lib_name, name), {}),
                 }
                 for name, func in lib.tags.items()
             },
             "filters": {
                 name: {
-                    "docs": func.__doc__.strip() if func.__doc__ else "",
+                    "docs": get_docs(func),
                     "source": self.get_source_from_type(func),
                 }
                 for name, func in lib.filters.items()
@@ -428,28 +578,62 @@ class DjangoIndexCollector:
     # Templates
     # ---------------------------------------------------------------------------------
     def get_templates(self):
-        template_files = {}
-        default_engine = Engine.get_default()
-        for templates_dir in [
-            *default_engine.dirs,
-            *get_app_template_dirs("templates"),
-        ]:
-            for root, dirs, files in os.walk(templates_dir):
-                for file in files:
-                    template_name = os.path.relpath(
-                        os.path.join(root, file), templates_dir
+        template_paths = {}
+
+        # Walking and reading templates is I/O bound, do it in threads
+        with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as ex:
+            # Results are in templates_dirs (loader) order
+            for template_files in ex.map(
+                lambda templates_dir: list(
+                    self._scandir_files(
+                        templates_dir, skip_directories=TEMPLATE_SKIP_DIRECTORIES
                     )
-
-                    if template_name in template_files:
-                        # Skip already procecesed template
+                ),
+                self.templates_dirs,
+            ):
+                for template_path, template_name in template_files:
+                    if template_name in template_paths:
+                        # Skip already found template
                         # (template have duplicates because other apps can override)
                         continue
 
-                    # Get used template (other apps can override templates)
-                    template_files[template_name] = self._parse_template(
-                        self._get_template(default_engine, template_name),
-                    )
-        return template_files
+                    file_name = template_name.rpartition("/")[2]
+                    if file_name.startswith(".") or file_name.endswith(".pyc"):
+                        # Skip hidden and compiled files
+                        continue
+
+                    # Directories are walked in loader order, so the first found
+                    # template is the one that is used (other apps can override)
+                    template_paths[template_name] = template_path
+
+            parsed_templates = ex.map(
+                lambda item: self._parse_template(self._read_template(*item)),
+                [(path, name) for name, path in template_paths.items()],
+            )
+            return dict(zip(template_paths, parsed_templates))
+
+    @cached_property
+    def fake_request(self):
+        """Lightweight request stub used for creating views"""
+        try:
+            from django.contrib.auth.models import AnonymousUser
+
+            user = AnonymousUser()
+        except Exception:
+            # Auth app is not installed
+            user = None
+
+        return SimpleNamespace(
+            method="GET",
+            META={},
+            GET={},
+            POST={},
+            COOKIES={},
+            path="/",
+            user=user,
+            session={},
+            resolver_match=None,
+        )
 
     def add_template_context_for_view(self, view):
         if not issubclass(view, View):
@@ -457,7 +641,22 @@ class DjangoIndexCollector:
             # views (FBVs) are not supported
             return
 
-        view_obj = view(request=MagicMock())
+        # Creating the view is expensive, skip it when the static template is not
+        # indexed and only Django's get_template_names (which returns
+        # template_name first) is used.
+        static_template_name = getattr(view, "template_name", None)
+        if (
+            static_template_name
+            and static_template_name not in self.templates
+            and all(
+                klass.__module__.startswith("django.")
+                for klass in view.__mro__
+                if "get_template_names" in klass.__dict__
+            )
+        ):
+            return
+
+        view_obj = view(request=self.fake_request)
 
         try:
             template_name = view_obj.get_template_names()[0]
@@ -496,39 +695,32 @@ class DjangoIndexCollector:
     def _parse_template(self, template: Template) -> dict:
         extends = None
         blocks = set()
-        for line in template.content.splitlines():
-            if match := self.re_extends.match(line):
-                extends = match.group(1)
-            if match := self.re_block.match(line):
-                blocks.add(match.group(1))
-
-        path = ""
-        if template.path.startswith(self.project_src_path):
-            path = (
-                f"src:{template.path.removeprefix(self.project_src_path).lstrip('/')}"
-            )
-        elif template.path.startswith(sys.prefix):
-            path = f"env:{template.path.removeprefix(sys.prefix).lstrip('/')}"
+        content = template.content
+        # Fast substring checks, to skip the regex for templates without tags
+        if "{%" in content and ("extends" in content or "block" in content):
+            for match in self.re_template_tags.finditer(content):
+                tag, quoted_name, name = match.groups()
+                if tag == "extends":
+                    if quoted_name:
+                        extends = quoted_name
+                elif name:
+                    blocks.add(name)
 
         return {
-            "path": path,
+            "path": self.get_path_reference(template.path),
             "extends": extends,
             "blocks": list(blocks),
             "context": {},
         }
 
-    def _get_template(self, engine: Engine, template_name: str) -> Template:
-        for loader in engine.template_loaders:
-            for origin in loader.get_template_sources(template_name):
-                try:
-                    return Template(
-                        path=str(origin),
-                        name=template_name,
-                        content=loader.get_contents(origin),
-                    )
-                except Exception:
-                    pass
-        return Template(name=template_name)
+    def _read_template(self, path: str, template_name: str) -> Template:
+        try:
+            with open(path, "rb") as fp:
+                content = fp.read().decode("utf-8", "replace")
+        except OSError as e:
+            logger.error(f"Failed to read template ({path}): {e}")
+            content = ""
+        return Template(path=path, name=template_name, content=content)
 
     # Global context
     # ---------------------------------------------------------------------------------
@@ -540,16 +732,21 @@ class DjangoIndexCollector:
             "None": None,
         }
 
-        # Update object types
-        TEMPLATE_CONTEXT_PROCESSORS["django.contrib.auth.context_processors.auth"][
-            "user"
-        ] = f"{get_user_model().__module__}.{get_user_model().__name__}"
+        # Update object types (on a copy, keep module level mapping untouched)
+        auth_processor = "django.contrib.auth.context_processors.auth"
+        context_processors = {
+            **TEMPLATE_CONTEXT_PROCESSORS,
+            auth_processor: {
+                **TEMPLATE_CONTEXT_PROCESSORS[auth_processor],
+                "user": self.get_type_full_name(get_user_model()),
+            },
+        }
 
-        for context_processor in Engine.get_default().template_context_processors:
+        for context_processor in self.engine.template_context_processors:
             module_path = ".".join(
                 [context_processor.__module__, context_processor.__name__]
             )
-            if context := TEMPLATE_CONTEXT_PROCESSORS.get(module_path):
+            if context := context_processors.get(module_path):
                 global_context.update(context)
         return global_context
 
@@ -560,18 +757,13 @@ class DjangoIndexCollector:
             from wagtail.models import Page
         except ImportError:
             return
-        for model in apps.get_models():
+        for model in self.models:
             if issubclass(model, Page) and model.template in self.templates:
-                self.templates[model.template]["context"].update(
-                    {
-                        "page": model.__module__ + "." + model.__name__,
-                        "self": model.__module__ + "." + model.__name__,
-                    }
-                )
+                page_type = self.get_type_full_name(model)
+                context = {"page": page_type, "self": page_type}
                 if model.context_object_name:
-                    self.templates[model.template]["context"][
-                        model.context_object_name
-                    ] = (model.__module__ + "." + model.__name__)
+                    context[model.context_object_name] = page_type
+                self.templates[model.template]["context"].update(context)
 
 
 #######################################################################################
@@ -602,6 +794,7 @@ if __name__ == "__main__":
     )
     parser.add_argument("--django-settings-module", action="store", type=str)
     parser.add_argument("--project-src", action="store", type=str)
+    parser.add_argument("--pretty", action="store_true", help="Indent JSON output")
     args = parser.parse_args()
 
     project_src_path = args.project_src if args.project_src else os.getcwd()
@@ -630,4 +823,7 @@ if __name__ == "__main__":
     collector = DjangoIndexCollector(project_src_path)
     collector.collect()
 
-    print(collector.to_json())
+    # Always write UTF-8 (not escaped) JSON, independent of the system locale
+    stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+    collector.write_json(stdout, pretty=args.pretty)
+    stdout.flush()
@@ -1,9 +1,17 @@
+import asyncio
+import glob
+import hashlib
 import http.client
 import json
 import logging
 import os
+import re
 import shutil
+import stat
 import subprocess
+import tempfile
+import threading
+import time
 import uuid
 from functools import cached_property
 
@@ -20,6 +28,8 @@ from lsprotocol.types import (
     DefinitionParams,
     DidChangeWatchedFilesParams,
     DidChangeWatchedFilesRegistrationOptions,
+    FileChangeType,
+    FileEvent,
     FileSystemWatcher,
     HoverParams,
     InitializeParams,
@@ -27,15 +37,24 @@ from lsprotocol.types import (
     RegistrationParams,
 )
 from pygls.server import LanguageServer
+from pygls.uris import to_fs_path
 
 from djlsp import __version__
 from djlsp.constants import FALLBACK_DJANGO_DATA
 from djlsp.index import WorkspaceIndex
 from djlsp.parser import TemplateParser
 
+try:
+    # Optional, faster parsing of the (large) Django data JSON
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
 logger = logging.getLogger(__name__)
 
 
+MAX_COMPLETION_ITEMS = 50
+
 DJANGO_COLLECTOR_SCRIPT_PATH = os.path.join(
     os.path.dirname(os.path.realpath(__file__)),
     "scripts",
@@ -50,6 +69,12 @@ class DjangoTemplateLanguageServer(LanguageServer):
         "venv",
         ".venv",
     ]
+    WATCH_SKIP_DIRECTORIES = {"__pycache__", "node_modules"}
+    re_watch_directory_glob = re.compile(r"\*\*/([^/*?\[\]]+)/\*\*")
+    re_watch_extension_glob = re.compile(r"\*\*/\*(\.[\w]+)")
+    # Settings, urls, views and models change the collected data without being
+    # matched by the file watcher globs of the collector.
+    CACHE_EXTRA_GLOBS = ["**/*.py"]
 
     def __init__(self, *args):
         super().__init__(*args)
@@ -58,27 +83,64 @@ class DjangoTemplateLanguageServer(LanguageServer):
         self.docker_compose_file = "docker-compose.yml"
         self.docker_compose_service = "django"
         self.django_settings_module = ""
+        self.cache = False
         self.workspace_index = WorkspaceIndex()
         self.workspace_index.update(FALLBACK_DJANGO_DATA)
         self.jedi_project = jedi.Project(".")
+        self.jedi_project_paths = None
         self.is_initialized = False
+        self.collect_timer = None
+        # Running/queued collect tasks, asyncio only keeps weak references
+        self.collect_tasks = set()
+        self.collect_queued = False
+        self.collect_lock = asyncio.Lock()
+        # Parsers by document uri: (document version, parser)
+        self.template_parsers = {}
+        # ((compose file path, mtime), services)
+        self.docker_compose_services = (None, [])
 
     @cached_property
+    def project_layout(self):
+        """
+        (src path, env path) of the workspace, found in one pass over the
+        root folder. Src is the first folder with a manage.py file, env the
+        first of ENV_DIRECTORIES with a python binary.
+        """
+        src_path = None
+        env_paths = {}
+        try:
+            with os.scandir(self.workspace.root_path) as it:
+                for entry in it:
+                    if not entry.is_dir():
+                        continue
+                    if entry.name in self.ENV_DIRECTORIES:
+                        env_paths[entry.name] = entry.path
+                    if src_path is None and os.path.exists(
+                        os.path.join(entry.path, "manage.py")
+                    ):
+                        src_path = entry.path
+        except OSError as e:
+            logger.error(f"Could not scan workspace: {e}")
+
+        env_path = next(
+            (
+                env_paths[env_dir]
+                for env_dir in self.ENV_DIRECTORIES
+                if env_dir in env_paths
+                and os.path.exists(os.path.join(env_paths[env_dir], "bin", "python"))
+            ),
+            None,
+        )
+        return src_path or self.workspace.root_path, env_path
+
+    @property
     def project_src_path(self):
         """Root path to src files, auto detect based on manage.py file"""
-        for name in os.listdir(self.workspace.root_path):
-            src_path = os.path.join(self.workspace.root_path, name)
-            if os.path.exists(os.path.join(src_path, "manage.py")):
-                return src_path
-        return self.workspace.root_path
+        return self.project_layout[0]
 
-    @cached_property
+    @property
     def project_env_path(self):
-        for env_dir in self.ENV_DIRECTORIES:
-            if os.path.exists(
-                os.path.join(self.workspace.root_path, env_dir, "bin", "python")
-            ):
-                return os.path.join(self.workspace.root_path, env_dir)
+        return self.project_layout[1]
 
     @property
     def docker_compose_path(self):
@@ -94,39 +156,104 @@ class DjangoTemplateLanguageServer(LanguageServer):
         self.django_settings_module = options.get(
             "django_settings_module", self.django_settings_module
         )
+        self.cache = options.get("cache", self.cache)
+
+    @property
+    def cache_directory(self):
+        # Per user, a shared temp file can be owned (or written) by other users
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        return os.path.join(cache_home, "djlsp")
+
+    @property
+    def version_check_location(self):
+        return os.path.join(self.cache_directory, "version-check.json")
 
     def check_version(self):
+        # Network request, don't block the initialization
+        threading.Thread(target=self._check_version, daemon=True).start()
+
+    def _check_version(self):
+        # Latest version and PyPI ETag of the last check, PyPI is asked at most
+        # once a day and only sends the (large) JSON when it has changed.
+        check_file = self.version_check_location
         try:
-            connection = http.client.HTTPSConnection("pypi.org", timeout=1)
-            connection.request(
-                "GET",
-                "/pypi/django-template-lsp/json",
-                headers={"User-Agent": "Python/3"},
-            )
-            response = connection.getresponse()
-            if response.status == 200:
-                latest_version = (
-                    json.loads(response.read().decode("utf-8"))
-                    .get("info", {})
-                    .get("version", "0.0.0")
+            with open(check_file) as fp:
+                last_check = json.load(fp)
+            checked_recently = time.time() - os.stat(check_file).st_mtime < 24 * 60 * 60
+        except (OSError, ValueError):
+            last_check = {}
+            checked_recently = False
+
+        latest_version = last_check.get("version")
+        if not checked_recently or not latest_version:
+            try:
+                headers = {"User-Agent": "Python/3"}
+                if last_check.get("etag") and latest_version:
+                    headers["If-None-Match"] = last_check["etag"]
+                connection = http.client.HTTPSConnection("pypi.org", timeout=1)
+                connection.request(
+                    "GET", "/pypi/django-template-lsp/json", headers=headers
                 )
-                if self._parse_version(latest_version) > self._parse_version(
-                    __version__
-                ):
-                    self.show_message(
-                        f"There is a new version for djlsp ({latest_version})"
-                        ", upgrade with `pipx upgrade django-template-lsp`"
+                response = connection.getresponse()
+                if response.status == 200:
+                    latest_version = (
+                        json_loads(response.read())
+                        .get("info", {})
+                        .get("version", "0.0.0")
                     )
-        except Exception as e:
+                elif response.status != 304:
+                    return
+                etag = response.getheader("ETag", last_check.get("etag"))
+            except Exception as e:
+                logger.error(f"Could not check latest version: {e}")
+                return
+
+            # Failing to store the check should not hide the upgrade message
+            try:
+                os.makedirs(os.path.dirname(check_file), exist_ok=True)
+                with open(check_file, "w") as fp:
+                    json.dump({"etag": etag, "version": latest_version}, fp)
+            except OSError as e:
+                logger.error(f"Could not store version check: {e}")
+
+        try:
+            if self._parse_version(latest_version) > self._parse_version(__version__):
+                self.loop.call_soon_threadsafe(
+                    self.show_message,
+                    f"There is a new version for djlsp ({latest_version})"
+                    ", upgrade with `pipx upgrade django-template-lsp`",
+                )
+        except ValueError as e:
             logger.error(f"Could not check latest version: {e}")
 
     def _parse_version(self, version):
         # Split the version into major, minor, and patch components
         return tuple(map(int, str(version).split(".")))
 
+    def _aggregate_globs(self, globs):
+        """
+        Combine `**/<name>/**` globs into one `**/{a,b}/**` glob, so the
+        client only needs a single watcher for them.
+        """
+        directories = []
+        aggregated = []
+        for glob_pattern in dict.fromkeys(globs):
+            if match := self.re_watch_directory_glob.fullmatch(glob_pattern):
+                directories.append(match.group(1))
+            else:
+                aggregated.append(glob_pattern)
+
+        if len(directories) > 1:
+            aggregated.insert(0, f"**/{{{','.join(directories)}}}/**")
+        elif directories:
+            aggregated.insert(0, f"**/{directories[0]}/**")
+        return aggregated
+
     def set_file_watcher_capability(self):
         logger.info(
-            f"Update file watcher patterns to: {self.current_file_watcher_globs}"
+            "Update file watcher patterns to: %s", self.current_file_watcher_globs
         )
         self.register_capability(
             RegistrationParams(
@@ -137,7 +264,9 @@ class DjangoTemplateLanguageServer(LanguageServer):
                         register_options=DidChangeWatchedFilesRegistrationOptions(
                             watchers=[
                                 FileSystemWatcher(glob_pattern=glob_pattern)
-                                for glob_pattern in self.current_file_watcher_globs
+                                for glob_pattern in self._aggregate_globs(
+                                    self.current_file_watcher_globs
+                                )
                             ]
                         ),
                     )
@@ -145,24 +274,26 @@ class DjangoTemplateLanguageServer(LanguageServer):
             )
         )
 
-    def get_django_data(self):
+    async def get_django_data(self):
+        # Collect runs in a thread so requests are still handled in the
+        # meantime, the lock makes sure only one collect runs at a time.
+        async with self.collect_lock:
+            await self._get_django_data()
+
+    async def _get_django_data(self):
         self.workspace_index.src_path = self.project_src_path
         self.workspace_index.env_path = self.project_env_path
-        self.jedi_project = jedi.Project(
-            path=self.project_src_path, environment_path=self.project_env_path
-        )
-
-        if self.project_env_path:
-            django_data = self._get_django_data_from_python_path(
-                os.path.join(self.project_env_path, "bin", "python")
+        jedi_project_paths = (self.project_src_path, self.project_env_path)
+        if self.jedi_project_paths != jedi_project_paths:
+            self.jedi_project_paths = jedi_project_paths
+            self.jedi_project = jedi.Project(
+                path=self.project_src_path, environment_path=self.project_env_path
             )
-        elif self._has_valid_docker_service():
-            django_data = self._get_django_data_from_docker()
-        elif python_path := shutil.which("python3"):
-            # Try getting data with global python installtion
-            django_data = self._get_django_data_from_python_path(python_path)
-        else:
-            django_data = None
+
+        django_data = await self.loop.run_in_executor(None, self._load_django_data)
+
+        # Parsers use the old index and jedi project
+        self.template_parsers.clear()
 
         if django_data:
             # TODO: Maybe validate data
@@ -192,50 +323,320 @@ class DjangoTemplateLanguageServer(LanguageServer):
             self.current_file_watcher_globs = self.workspace_index.file_watcher_globs
             self.set_file_watcher_capability()
 
-    def _get_django_data_from_python_path(self, python_path):
-        logger.info(f"Collection django data from local python path: {python_path}")
+    def get_template_parser(self, uri: str) -> TemplateParser:
+        """
+        Parser for the document, reused between requests (completion, hover,
+        goto) as long as the document version doesn't change.
+        """
+        document = self.workspace.get_document(uri)
+        if (cached := self.template_parsers.get(uri)) and (
+            document.version is not None and cached[0] == document.version
+        ):
+            return cached[1]
 
-        command = list(
-            filter(
-                None,
-                [
-                    python_path,
-                    DJANGO_COLLECTOR_SCRIPT_PATH,
-                    (
-                        f"--django-settings-module={self.django_settings_module}"  # noqa: E501
-                        if self.django_settings_module
-                        else None
-                    ),
-                    f"--project-src={self.project_src_path}",
-                ],
+        template_parser = TemplateParser(
+            workspace_index=self.workspace_index,
+            jedi_project=self.jedi_project,
+            document=document,
+        )
+        self.template_parsers.pop(uri, None)
+        if len(self.template_parsers) >= 8:
+            # Drop least recently parsed document
+            del self.template_parsers[next(iter(self.template_parsers))]
+        self.template_parsers[uri] = (document.version, template_parser)
+        return template_parser
+
+    def schedule_django_data(self, delay=0.4):
+        """
+        Collect Django data after `delay` seconds, rescheduled on every call so
+        a burst of file changes (checkout, formatter) results in one collect.
+        """
+        if self.collect_timer:
+            self.collect_timer.cancel()
+        self.collect_timer = self.loop.call_later(delay, self._start_collect)
+
+    def _start_collect(self):
+        if self.collect_queued:
+            # Queued collect runs after the current one, it sees these changes
+            return
+        self.collect_queued = True
+        task = self.loop.create_task(self._queued_collect())
+        self.collect_tasks.add(task)
+        task.add_done_callback(self._collect_done)
+
+    async def _queued_collect(self):
+        async with self.collect_lock:
+            self.collect_queued = False
+            await self._get_django_data()
+
+    def _collect_done(self, task):
+        self.collect_tasks.discard(task)
+        if not task.cancelled() and (exception := task.exception()):
+            logger.error(f"Could not collect Django data: {exception}")
+
+    def requires_collect(self, changes: list[FileEvent]) -> bool:
+        """
+        Whether the changed files can change the collected Django data.
+
+        Only names of static files are collected, so editing the content of a
+        static file doesn't need a new collect.
+        """
+        for change in changes:
+            if change.type != FileChangeType.Changed:
+                return True
+            path = to_fs_path(change.uri) or ""
+            if "/static/" not in path or "/templates/" in path or path.endswith(".py"):
+                return True
+        return False
+
+    def _load_django_data(self):
+        if not self.cache:
+            return self._collect_django_data()
+
+        cache = self._get_django_data_cache()
+        cached_globs = cache.get("django_data", {}).get("file_watcher_globs", [])
+        # Hash before collecting, so files changed during the collect still
+        # invalidate the stored data.
+        file_hash = self._get_cache_file_hash(cached_globs)
+        if cache.get("django_data") and cache.get("file_hash") == file_hash:
+            logger.info(f"Using cached Django data: {self.cache_location}")
+            return cache["django_data"]
+        logger.info("Django data cache is outdated")
+
+        django_data = self._collect_django_data()
+        if django_data:
+            file_watcher_globs = django_data.get("file_watcher_globs", [])
+            if file_watcher_globs != cached_globs:
+                # Other files are watched now (first collect), hash those
+                file_hash = self._get_cache_file_hash(file_watcher_globs)
+            self._store_django_data_to_cache(django_data, file_hash)
+        return django_data
+
+    def _collect_django_data(self):
+        if self.project_env_path:
+            return self._get_django_data_from_python_path(
+                os.path.join(self.project_env_path, "bin", "python")
             )
+        elif self._has_valid_docker_service():
+            return self._get_django_data_from_docker()
+        elif python_path := shutil.which("python3"):
+            # Try getting data with global python installtion
+            return self._get_django_data_from_python_path(python_path)
+        return None
+
+    @cached_property
+    def cache_location(self):
+        if self.cache is True:
+            root_hash = hashlib.md5(self.workspace.root_path.encode()).hexdigest()
+            return os.path.join(self.cache_directory, f"{root_hash}.json")
+        return self.cache
+
+    def _get_cache_file_hash(self, file_watcher_globs):
+        """
+        Hash of the collect settings and the modification times of all files
+        matched by the file watcher globs and all python files of the project,
+        changes when a new collect is needed.
+        """
+        try:
+            compose_mtime = os.stat(self.docker_compose_path).st_mtime_ns
+        except OSError:
+            compose_mtime = None
+        files_hash = hashlib.md5()
+        files_hash.update(
+            f"{__version__}:{self.django_settings_module}:"
+            f"{os.stat(DJANGO_COLLECTOR_SCRIPT_PATH).st_mtime}:"
+            # Interpreter used for the collect
+            f"{self.project_env_path}:{shutil.which('python3')}:"
+            f"{self.docker_compose_path}:{compose_mtime}:"
+            f"{self.docker_compose_service}".encode()
+        )
+
+        # Dict removes files matched by multiple globs
+        watched_files = dict(
+            self._iter_watched_files([*file_watcher_globs, *self.CACHE_EXTRA_GLOBS])
+        )
+        # One update/encode for all files instead of one per file
+        files_hash.update(
+            "\n".join(
+                f"{file_path}:{mtime}"
+                for file_path, mtime in sorted(watched_files.items())
+            ).encode()
         )
+        return files_hash.hexdigest()
+
+    def _iter_watched_files(self, file_watcher_globs):
+        """
+        Yield (path, mtime) for all files matched by the file watcher globs.
+
+        `**/<name>/**` and `**/*.<ext>` globs are matched in a single scandir
+        walk that never enters the environment, hidden or cache directories.
+        Other globs fall back to glob.
+        """
+        watched_directories = set()
+        watched_extensions = set()
+        for glob_pattern in file_watcher_globs:
+            if match := self.re_watch_directory_glob.fullmatch(glob_pattern):
+                watched_directories.add(match.group(1))
+            elif match := self.re_watch_extension_glob.fullmatch(glob_pattern):
+                watched_extensions.add(match.group(1))
+            else:
+                for file_path in glob.iglob(
+                    os.path.join(self.project_src_path, glob_pattern), recursive=True
+                ):
+                    if "__pycache__" in file_path or (
+                        self.project_env_path
+                        and file_path.startswith(self.project_env_path)
+                    ):
+                        continue
+                    try:
+                        file_stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(file_stat.st_mode):
+                        yield file_path, file_stat.st_mtime_ns
+
+        if not watched_directories and not watched_extensions:
+            return
+        watched_extensions = tuple(watched_extensions)
+
+        stack = [(self.project_src_path, False)]
+        while stack:
+            directory, is_watched = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                # Hidden files and directories are not matched by glob
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if (
+                            entry.name not in self.WATCH_SKIP_DIRECTORIES
+                            and entry.path != self.project_env_path
+                        ):
+                            stack.append(
+                                (
+                                    entry.path,
+                                    is_watched or entry.name in watched_directories,
+                                )
+                            )
+                    elif (
+                        is_watched or entry.name.endswith(watched_extensions)
+                    ) and entry.is_file():
+                        yield entry.path, entry.stat().st_mtime_ns
+                except OSError:
+                    continue
+
+    def _get_django_data_cache(self):
+        try:
+            with open(self.cache_location, "rb") as fp:
+                cache = json_loads(fp.read())
+        except (OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def _store_django_data_to_cache(self, django_data, file_hash):
+        cache = {
+            "file_hash": file_hash,
+            "django_data": django_data,
+        }
+        cache_directory = os.path.dirname(self.cache_location) or "."
+        temp_path = None
+        try:
+            os.makedirs(cache_directory, exist_ok=True)
+            # Write to a unique temporary file and replace, so readers never
+            # see a partial cache file and other servers don't share the file.
+            with tempfile.NamedTemporaryFile(
+                "w", dir=cache_directory, suffix=".tmp", delete=False
+            ) as fp:
+                temp_path = fp.name
+                json.dump(cache, fp)
+            os.replace(temp_path, self.cache_location)
+        except OSError as e:
+            logger.error(f"Could not store Django data cache: {e}")
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+    def _get_django_data_from_python_path(self, python_path):
+        logger.info(f"Collection django data from local python path: {python_path}")
+
+        command = [python_path, DJANGO_COLLECTOR_SCRIPT_PATH]
+        if self.django_settings_module:
+            command.append(f"--django-settings-module={self.django_settings_module}")
+        command.append(f"--project-src={self.project_src_path}")
 
         logger.debug(f"Collector command: {' '.join(command)}")
 
         try:
-            return json.loads(subprocess.check_output(command).decode())
+            return json_loads(subprocess.check_output(command))
         except Exception as e:
             logger.error(e)
             return False
 
     def _has_valid_docker_service(self):
-        if os.path.exists(self.docker_compose_path):
-            services = (
-                subprocess.check_output(
-                    [
-                        "docker",
-                        "compose",
-                        f"--file={self.docker_compose_path}",
-                        "config",
-                        "--services",
-                    ]
-                )
-                .decode()
-                .splitlines()
+        try:
+            compose_mtime = os.stat(self.docker_compose_path).st_mtime_ns
+        except OSError:
+            return False
+
+        # Services only change with the compose file, skip the docker call
+        cache_key = (self.docker_compose_path, compose_mtime)
+        if self.docker_compose_services[0] != cache_key:
+            services = self._get_docker_compose_services_from_file()
+            if services is None:
+                services = self._get_docker_compose_services_from_docker()
+            self.docker_compose_services = (cache_key, services)
+        return self.docker_compose_service in self.docker_compose_services[1]
+
+    def _get_docker_compose_services_from_file(self):
+        """
+        Services read directly from the compose file, without starting docker.
+        Returns None when docker compose is needed to get the services.
+        """
+        try:
+            import yaml
+        except ImportError:
+            return None
+
+        try:
+            with open(self.docker_compose_path) as fp:
+                config = yaml.safe_load(fp)
+        except (OSError, yaml.YAMLError):
+            return None
+
+        if not isinstance(config, dict) or "include" in config:
+            return None
+        services = config.get("services")
+        if not isinstance(services, dict):
+            return None
+        for service in services.values():
+            if isinstance(service, dict) and (
+                "extends" in service or "profiles" in service
+            ):
+                # Resolved by docker compose, can add or hide services
+                return None
+        return list(services)
+
+    def _get_docker_compose_services_from_docker(self):
+        return (
+            subprocess.check_output(
+                [
+                    "docker",
+                    "compose",
+                    f"--file={self.docker_compose_path}",
+                    "config",
+                    "--services",
+                ]
             )
-            return self.docker_compose_service in services
-        return False
+            .decode()
+            .splitlines()
+        )
 
     def _get_django_data_from_docker(self):
         logger.info(
@@ -246,37 +647,36 @@ class DjangoTemplateLanguageServer(LanguageServer):
         if not docker_image:
             return False
 
-        docker_run_command = list(
-            filter(
-                None,
-                [
-                    "docker",
-                    "run",
-                    "--rm",
-                    f"--volume={DJANGO_COLLECTOR_SCRIPT_PATH}:/django-collector.py",
-                    f"--volume={self.project_src_path}:/src",
-                    docker_image,
-                    "python",
-                    "/django-collector.py",
-                    (
-                        f"--django-settings-module={self.django_settings_module}"
-                        if self.django_settings_module
-                        else None
-                    ),
-                    "--project-src=/src",
-                ],
+        docker_run_command = [
+            "docker",
+            "run",
+            "--rm",
+            f"--volume={DJANGO_COLLECTOR_SCRIPT_PATH}:/django-collector.py",
+            f"--volume={self.project_src_path}:/src",
+            docker_image,
+            "python",
+            "/django-collector.py",
+        ]
+        if self.django_settings_module:
+            docker_run_command.append(
+                f"--django-settings-module={self.django_settings_module}"
             )
-        )
+        docker_run_command.append("--project-src=/src")
 
         logger.debug(f"Collector command: {' '.join(docker_run_command)}")
 
         try:
-            return json.loads(subprocess.check_output(docker_run_command).decode())
+            return json_loads(subprocess.check_output(docker_run_command))
         except Exception as e:
             logger.error(e)
             return False
 
     def _get_docker_image(self):
+        # Container already exists most of the time, only create it when
+        # there is no image yet (`create --no-recreate` wouldn't change it).
+        if docker_image := self._get_docker_compose_image():
+            return docker_image
+
         try:
             # Make sure image is created
             subprocess.check_call(
@@ -293,8 +693,11 @@ class DjangoTemplateLanguageServer(LanguageServer):
             logger.error(e)
             return None
 
+        return self._get_docker_compose_image()
+
+    def _get_docker_compose_image(self):
         try:
-            images = json.loads(
+            images = json_loads(
                 subprocess.check_output(
                     [
                         "docker",
@@ -319,13 +722,13 @@ server = DjangoTemplateLanguageServer("django-template-lsp", __version__)
 
 
 @server.feature(INITIALIZE)
-def initialized(ls: DjangoTemplateLanguageServer, params: InitializeParams):
-    logger.info(f"COMMAND: {INITIALIZE}")
-    logger.debug(f"OPTIONS: {params.initialization_options}")
+async def initialized(ls: DjangoTemplateLanguageServer, params: InitializeParams):
+    logger.info("COMMAND: %s", INITIALIZE)
+    logger.debug("OPTIONS: %s", params.initialization_options)
     if params.initialization_options:
         ls.set_initialization_options(params.initialization_options)
     ls.check_version()
-    ls.get_django_data()
+    await ls.get_django_data()
     ls.is_initialized = True
 
 
@@ -334,16 +737,25 @@ def initialized(ls: DjangoTemplateLanguageServer, params: InitializeParams):
     CompletionOptions(trigger_characters=[" ", "|", "'", '"', "."]),
 )
 def completions(ls: DjangoTemplateLanguageServer, params: CompletionParams):
-    logger.info(f"COMMAND: {TEXT_DOCUMENT_COMPLETION}")
-    logger.debug(f"PARAMS: {params}")
+    logger.info("COMMAND: %s", TEXT_DOCUMENT_COMPLETION)
+    logger.debug("PARAMS: %s", params)
     try:
+        document = ls.workspace.get_document(params.text_document.uri)
+        line_fragment = document.lines[params.position.line][
+            : params.position.character
+        ]
+        if "{" not in line_fragment:
+            # All completions need a `{%`, `{{` or `{#` before the cursor on
+            # this line, skip the parser for plain text/HTML
+            return CompletionList(is_incomplete=False, items=[])
+
+        template = ls.get_template_parser(params.text_document.uri)
+        items = template.completions(params.position.line, params.position.character)
+        # Large lists (all context variables for `{{ `) are cut off, the client
+        # asks again when the user types more.
         return CompletionList(
-            is_incomplete=False,
-            items=TemplateParser(
-                workspace_index=ls.workspace_index,
-                jedi_project=ls.jedi_project,
-                document=server.workspace.get_document(params.text_document.uri),
-            ).completions(params.position.line, params.position.character),
+            is_incomplete=len(items) > MAX_COMPLETION_ITEMS,
+            items=items[:MAX_COMPLETION_ITEMS],
         )
     except Exception as e:
         logger.error(e)
@@ -352,14 +764,12 @@ def completions(ls: DjangoTemplateLanguageServer, params: CompletionParams):
 
 @server.feature(TEXT_DOCUMENT_HOVER)
 def hover(ls: DjangoTemplateLanguageServer, params: HoverParams):
-    logger.info(f"COMMAND: {TEXT_DOCUMENT_HOVER}")
-    logger.debug(f"PARAMS: {params}")
+    logger.info("COMMAND: %s", TEXT_DOCUMENT_HOVER)
+    logger.debug("PARAMS: %s", params)
     try:
-        return TemplateParser(
-            workspace_index=ls.workspace_index,
-            jedi_project=ls.jedi_project,
-            document=server.workspace.get_document(params.text_document.uri),
-        ).hover(params.position.line, params.position.character)
+        return ls.get_template_parser(params.text_document.uri).hover(
+            params.position.line, params.position.character
+        )
     except Exception as e:
         logger.error(e)
         return None
@@ -367,14 +777,12 @@ def hover(ls: DjangoTemplateLanguageServer, params: HoverParams):
 
 @server.feature(TEXT_DOCUMENT_DEFINITION)
 def goto_definition(ls: DjangoTemplateLanguageServer, params: DefinitionParams):
-    logger.info(f"COMMAND: {TEXT_DOCUMENT_DEFINITION}")
-    logger.debug(f"PARAMS: {params}")
+    logger.info("COMMAND: %s", TEXT_DOCUMENT_DEFINITION)
+    logger.debug("PARAMS: %s", params)
     try:
-        return TemplateParser(
-            workspace_index=ls.workspace_index,
-            jedi_project=ls.jedi_project,
-            document=ls.workspace.get_document(params.text_document.uri),
-        ).goto_definition(params.position.line, params.position.character)
+        return ls.get_template_parser(params.text_document.uri).goto_definition(
+            params.position.line, params.position.character
+        )
     except Exception as e:
         logger.error(e)
         return None
@@ -384,7 +792,9 @@ def goto_definition(ls: DjangoTemplateLanguageServer, params: DefinitionParams):
 def files_changed(
     ls: DjangoTemplateLanguageServer, params: DidChangeWatchedFilesParams
 ):
-    logger.info(f"COMMAND: {WORKSPACE_DID_CHANGE_WATCHED_FILES}")
-    logger.debug(f"PARAMS: {params}")
-    # TODO: Do partial collect based on changed file type
-    ls.get_django_data()
+    logger.info("COMMAND: %s", WORKSPACE_DID_CHANGE_WATCHED_FILES)
+    logger.debug("PARAMS: %s", params)
+    if ls.requires_collect(params.changes):
+        ls.schedule_django_data()
+    else:
+        logger.debug("Only static file contents changed, skipping collect")
@@ -0,0 +1 @@
+// Static file reached through a symlinked directory
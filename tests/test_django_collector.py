@@ -1,7 +1,9 @@
 import json
 import os
-import shutil
 import subprocess
+import sys
+
+import pytest
 
 from djlsp.index import WorkspaceIndex
 from djlsp.server import DJANGO_COLLECTOR_SCRIPT_PATH
@@ -13,11 +15,13 @@ DJANGO_TEST_PROJECT_SRC = os.path.join(
 DJANGO_TEST_SETTINGS_MODULE = "django_test.settings"
 
 
-def test_django_collect():
-    django_data = json.loads(
+@pytest.fixture(scope="session")
+def django_data():
+    # Run collector once, it imports and sets up the whole Django project
+    return json.loads(
         subprocess.check_output(
             [
-                shutil.which("python"),  # Get tox python path
+                sys.executable,  # Python (tox env) running the tests
                 DJANGO_COLLECTOR_SCRIPT_PATH,
                 f"--django-settings-module={DJANGO_TEST_SETTINGS_MODULE}",
                 f"--project-src={DJANGO_TEST_PROJECT_SRC}",
@@ -25,12 +29,19 @@ def test_django_collect():
         )
     )
 
+
+@pytest.mark.slow
+def test_django_collect(django_data):
     index = WorkspaceIndex()
     index.update(django_data)
 
     assert "django_app_tag" in index.libraries["django_app"].tags
     assert index.libraries["django_app"].tags["django_app_tag"].docs == "Docs for tag"
 
+    assert index.libraries["__builtins__"].tags["for"].inner_tags == ["empty"]
+    assert index.libraries["__builtins__"].tags["for"].closing_tag == "endfor"
+    assert index.libraries["i18n"].tags["language"].closing_tag == "endlanguage"
+
     assert "django_app_filter" in index.libraries["django_app"].filters
     assert (
         index.libraries["django_app"].filters["django_app_filter"].docs
@@ -42,8 +53,12 @@ def test_django_collect():
         index.templates["django_app.html"].path
         == "src:django_app/templates/django_app.html"
     )
+    assert index.templates["django_app.html"].extends == "base.html"
+    assert set(index.templates["django_app.html"].blocks) == {"title", "content"}
 
     assert "django_app.js" in index.static_files
+    # Symlinked static directories are followed, like Django's storage does
+    assert "linked/lib/linked.js" in index.static_files
     assert "django_app:index" in index.urls
     assert set(index.file_watcher_globs) == {
         "**/templates/**",
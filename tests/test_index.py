@@ -0,0 +1,36 @@
+import pytest
+
+from djlsp.index import WorkspaceIndex, split_source
+
+
+@pytest.mark.parametrize(
+    "source,expected",
+    [
+        ("src:views.py:12", ("src", "views.py", 12)),
+        ("src:templates/index.html", ("src", "templates/index.html", 0)),
+        ("", None),
+        (None, None),
+        ("views.py", None),
+        ("src:views.py:abc", None),
+        ("src:views.py:", None),
+        ("src:c:views.py:12", None),
+        (12, None),
+    ],
+)
+def test_split_source(source, expected):
+    assert split_source(source) == expected
+
+
+def test_malformed_source_does_not_stop_index_loading():
+    workspace_index = WorkspaceIndex()
+    workspace_index.update(
+        {
+            "urls": {
+                "broken": {"source": "src:views.py:abc"},
+                "home": {"source": "src:views.py:12"},
+            },
+        }
+    )
+
+    assert workspace_index.urls["broken"].source_parts is None
+    assert workspace_index.urls["home"].source_parts == ("src", "views.py", 12)
@@ -1,4 +1,8 @@
+import os
+from functools import lru_cache
+
 import jedi
+import pytest
 from pygls.workspace import TextDocument
 
 from djlsp.constants import FALLBACK_DJANGO_DATA
@@ -6,7 +10,9 @@ from djlsp.index import WorkspaceIndex
 from djlsp.parser import TemplateParser
 
 
-def create_parser(source) -> TemplateParser:
+@lru_cache
+def create_workspace_index() -> WorkspaceIndex:
+    # Shared by all tests, parsers only read from the index
     workspace_index = WorkspaceIndex()
     workspace_index.update(
         {
@@ -48,10 +54,16 @@ def create_parser(source) -> TemplateParser:
             },
         }
     )
+    return workspace_index
+
 
+JEDI_PROJECT = jedi.Project(".")
+
+
+def create_parser(source) -> TemplateParser:
     return TemplateParser(
-        workspace_index=workspace_index,
-        jedi_project=jedi.Project("."),
+        workspace_index=create_workspace_index(),
+        jedi_project=JEDI_PROJECT,
         document=TextDocument(
             uri="file:///templates/test.html",
             source=source,
@@ -59,19 +71,107 @@ def create_parser(source) -> TemplateParser:
     )
 
 
+def labels(items) -> list[str]:
+    return [item.label for item in items]
+
+
 def test_completion_tags_builtins():
     parser = create_parser("{% url")
-    assert any(item.label == "load" for item in parser.completions(0, 2))
-    items = parser.completions(0, 4)
+    assert "load" in labels(parser.completions(0, 2))
+    items = labels(parser.completions(0, 4))
     assert items
-    assert all([item.label.startswith("ur") for item in items])
+    assert all(label.startswith("ur") for label in items)
+
+
+@pytest.mark.parametrize(
+    "source,line,character,label,present",
+    [
+        # Library tags need a load
+        ("{% ", 0, 2, "get_homepage", False),
+        ("{% load website %}\n{% ", 1, 2, "get_homepage", True),
+    ],
+)
+def test_completion_tags(source, line, character, label, present):
+    parser = create_parser(source)
+    assert (label in labels(parser.completions(line, character))) is present
+
+
+@pytest.mark.parametrize(
+    "source,expected",
+    [
+        ("{% url 'bl", ["blog:detail", "blog:list"]),
+        ("{% static 'js", ["js/main.js"]),
+        ("{% extends 'ba", ["base.html"]),
+        ("{% include 'bl", ["blog/list.html"]),
+    ],
+)
+def test_completion_prefix(source, expected):
+    parser = create_parser(source)
+    assert labels(parser.completions(0, len(source))) == expected
+
+
+def test_completion_context_attributes():
+    source = "{# type now: datetime.datetime #}\n{{ now.ye"
+    parser = create_parser(source)
+    assert labels(parser.completions(1, 9)) == ["year"]
+    # Same code is served from the parser's jedi results
+    assert parser.jedi_complete("now.ye") == parser.jedi_complete("now.ye")
+    assert ("complete", "now.ye") in parser.jedi_results
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "{% extends 'base.html' %}",
+        '{% extends "base.html" %}',
+        "{% include 'base.html' %}",
+        '{% include "base.html" %}',
+    ],
+)
+def test_goto_definition_template(source):
+    location = create_parser(source).goto_definition(0, 16)
+    assert location.uri == "file:///templates/base.html"
+
+
+@pytest.mark.parametrize(
+    "source,character,uri,line",
+    [
+        ("{% url 'blog:list' %}", 10, "file:///views.py", 22),
+        ("{% url 'blog:detail' %}", 10, "file:///views.py", 32),
+    ],
+)
+def test_goto_definition_url(source, character, uri, line):
+    location = create_parser(source).goto_definition(0, character)
+    assert location.uri == uri
+    assert location.range.start.line == line
+
+
+def test_completion_closing_tags():
+    parser = create_parser("{% for item in items %}\n{% end")
+    assert labels(parser.completions(1, 6)) == ["endfor"]
+
+
+def test_completion_filters():
+    parser = create_parser("{% load website %}\n{{ price|cur")
+    assert labels(parser.completions(1, 12)) == ["currency"]
 
 
-def test_completion_tags_missing_load():
-    parser = create_parser("{% ")
-    assert not any(item.label == "get_homepage" for item in parser.completions(0, 2))
+def test_completion_context_attributes_after_python_change(tmp_path):
+    module = tmp_path / "shop.py"
+    module.write_text("class Product:\n    price: int\n")
+    jedi_project = jedi.Project(tmp_path)
+    source = "{# type product: shop.Product #}\n{{ product.p"
 
+    def complete():
+        return labels(
+            TemplateParser(
+                workspace_index=create_workspace_index(),
+                jedi_project=jedi_project,
+                document=TextDocument(uri="file:///templates/test.html", source=source),
+            ).completions(1, 12)
+        )
 
-def test_completion_tags():
-    parser = create_parser("{% load website %}\n{% ")
-    assert any(item.label == "get_homepage" for item in parser.completions(1, 2))
+    assert complete() == ["price"]
+    module.write_text("class Product:\n    price: int\n    published: bool\n")
+    os.utime(module, ns=(0, module.stat().st_mtime_ns + 1_000_000_000))
+    assert complete() == ["price", "published"]
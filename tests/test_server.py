@@ -0,0 +1,514 @@
+import asyncio
+import json
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+from lsprotocol.types import (
+    CompletionParams,
+    FileChangeType,
+    FileEvent,
+    Position,
+    TextDocumentContentChangeEvent_Type2,
+    TextDocumentIdentifier,
+    TextDocumentItem,
+    VersionedTextDocumentIdentifier,
+)
+from pygls.uris import from_fs_path
+from pygls.workspace import Workspace
+
+from djlsp.constants import FALLBACK_DJANGO_DATA
+from djlsp.server import MAX_COMPLETION_ITEMS, DjangoTemplateLanguageServer, completions
+
+
+def touch(path, content=""):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fp:
+        fp.write(content)
+
+
+@pytest.fixture
+def server(tmp_path):
+    class Server(DjangoTemplateLanguageServer):
+        workspace = Workspace(from_fs_path(str(tmp_path)))
+
+    server = Server("django-template-lsp", "test")
+    server.cache = str(tmp_path / "cache.json")
+    loop = server.loop
+    yield server
+    loop.close()
+
+
+def open_document(server, source, name="index.html"):
+    uri = from_fs_path(os.path.join(server.workspace.root_path, "templates", name))
+    server.workspace.put_text_document(
+        TextDocumentItem(uri=uri, language_id="html", version=1, text=source)
+    )
+    return uri
+
+
+def change_document(server, uri, source):
+    document = server.workspace.get_text_document(uri)
+    server.workspace.update_text_document(
+        VersionedTextDocumentIdentifier(uri=uri, version=document.version + 1),
+        TextDocumentContentChangeEvent_Type2(text=source),
+    )
+
+
+def complete(server, uri, line, character):
+    return completions(
+        server,
+        CompletionParams(
+            text_document=TextDocumentIdentifier(uri=uri),
+            position=Position(line=line, character=character),
+        ),
+    )
+
+
+@pytest.fixture
+def collect(server, tmp_path):
+    """Replace the collect with fake Django data, returns the collect calls"""
+    calls = []
+
+    def collect_django_data():
+        calls.append(True)
+        return {
+            "file_watcher_globs": ["**/templates/**"],
+            "templates": {"index.html": {}},
+        }
+
+    touch(str(tmp_path / "app" / "templates" / "index.html"))
+    server._collect_django_data = collect_django_data
+    return calls
+
+
+def set_mtime(path, mtime_ns):
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_iter_watched_files(server, tmp_path):
+    touch(str(tmp_path / "app" / "templates" / "index.html"))
+    touch(str(tmp_path / "app" / "templates" / "blog" / "list.html"))
+    touch(str(tmp_path / "app" / "views.py"))
+    touch(str(tmp_path / "app" / "__pycache__" / "views.cpython-311.pyc"))
+    touch(str(tmp_path / "node_modules" / "pkg" / "templates" / "skip.html"))
+    touch(str(tmp_path / ".git" / "templates" / "skip.html"))
+    touch(str(tmp_path / "app" / "static" / "main.js"))
+
+    watched_files = dict(
+        server._iter_watched_files(["**/templates/**", "**/*.py", "**/*.pyc"])
+    )
+
+    assert sorted(os.path.relpath(path, tmp_path) for path in watched_files) == [
+        "app/templates/blog/list.html",
+        "app/templates/index.html",
+        "app/views.py",
+    ]
+    assert (
+        watched_files[str(tmp_path / "app" / "views.py")]
+        == os.stat(tmp_path / "app" / "views.py").st_mtime_ns
+    )
+
+
+def test_cache_miss_and_hit(server, collect):
+    assert server._load_django_data()["templates"] == {"index.html": {}}
+    assert os.path.exists(server.cache_location)
+    assert len(collect) == 1
+
+    assert server._load_django_data()["templates"] == {"index.html": {}}
+    assert len(collect) == 1
+
+
+def test_cache_stored_per_user(server, collect, monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    server.cache = True
+    server._load_django_data()
+
+    assert os.path.dirname(server.cache_location) == str(tmp_path / "cache" / "djlsp")
+    assert os.path.exists(server.cache_location)
+
+
+def test_cache_store_leaves_no_temporary_files(server, collect, tmp_path):
+    server._load_django_data()
+    assert sorted(os.listdir(tmp_path)) == ["app", "cache.json"]
+
+
+def test_cache_store_failure_removes_temporary_file(server, monkeypatch, tmp_path):
+    def replace(src, dst):
+        raise OSError("Read-only")
+
+    monkeypatch.setattr(os, "replace", replace)
+    server._store_django_data_to_cache({"templates": {}}, "hash")
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_invalidated_by_watched_file(server, collect, tmp_path):
+    server._load_django_data()
+    set_mtime(str(tmp_path / "app" / "templates" / "index.html"), 1_000_000_000)
+    server._load_django_data()
+    assert len(collect) == 2
+
+    touch(str(tmp_path / "app" / "templates" / "new.html"))
+    server._load_django_data()
+    assert len(collect) == 3
+
+
+@pytest.mark.parametrize("file_name", ["settings.py", "urls.py", "views.py"])
+def test_cache_invalidated_by_python_file(server, collect, tmp_path, file_name):
+    python_path = str(tmp_path / "project" / file_name)
+    touch(python_path)
+    server._load_django_data()
+    server._load_django_data()
+    assert len(collect) == 1
+
+    set_mtime(python_path, 1_000_000_000)
+    server._load_django_data()
+    assert len(collect) == 2
+
+
+def test_cache_not_invalidated_by_environment(server, collect, tmp_path):
+    touch(str(tmp_path / "venv" / "bin" / "python"))
+    server._load_django_data()
+    touch(str(tmp_path / "venv" / "lib" / "site.py"))
+    touch(str(tmp_path / "app" / "__pycache__" / "views.cpython-311.pyc"))
+    server._load_django_data()
+    assert len(collect) == 1
+
+
+def test_cache_invalidated_by_settings(server, collect):
+    server._load_django_data()
+    server.django_settings_module = "project.settings"
+    server._load_django_data()
+    assert len(collect) == 2
+
+    server.docker_compose_service = "web"
+    server._load_django_data()
+    assert len(collect) == 3
+
+
+def test_cache_invalidated_by_file_changed_during_collect(server, collect, tmp_path):
+    server._load_django_data()
+    template_path = str(tmp_path / "app" / "templates" / "index.html")
+    set_mtime(template_path, 1_000_000_000)
+
+    collect_django_data = server._collect_django_data
+
+    def collect_and_edit():
+        django_data = collect_django_data()
+        set_mtime(template_path, 2_000_000_000)
+        return django_data
+
+    server._collect_django_data = collect_and_edit
+    server._load_django_data()
+    assert len(collect) == 2
+
+    # Stored data is older than the edit, so it is collected again
+    server._load_django_data()
+    assert len(collect) == 3
+    server._load_django_data()
+    assert len(collect) == 3
+
+
+@pytest.mark.parametrize(
+    "globs,expected",
+    [
+        ([], []),
+        (["**/templates/**"], ["**/templates/**"]),
+        (
+            ["**/templates/**", "**/static/**", "**/templates/**"],
+            ["**/{templates,static}/**"],
+        ),
+        (
+            ["**/*.py", "**/templates/**", "**/static/**", "**/*.py"],
+            ["**/{templates,static}/**", "**/*.py"],
+        ),
+        (
+            ["**/templates/*.html", "src/**/templates/**"],
+            ["**/templates/*.html", "src/**/templates/**"],
+        ),
+    ],
+)
+def test_aggregate_globs(server, globs, expected):
+    assert server._aggregate_globs(globs) == expected
+
+
+def file_event(path, change_type=FileChangeType.Changed):
+    return FileEvent(uri=f"file://{path}", type=change_type)
+
+
+@pytest.mark.parametrize(
+    "changes,expected",
+    [
+        ([], False),
+        ([file_event("/src/app/static/js/main.js")], False),
+        (
+            [
+                file_event("/src/app/static/js/main.js"),
+                file_event("/src/app/static/css/main.css"),
+            ],
+            False,
+        ),
+        ([file_event("/src/app/static/js/new.js", FileChangeType.Created)], True),
+        ([file_event("/src/app/static/js/old.js", FileChangeType.Deleted)], True),
+        ([file_event("/src/app/templates/index.html")], True),
+        ([file_event("/src/app/static/templates/index.html")], True),
+        ([file_event("/src/app/static/settings.py")], True),
+        ([file_event("/src/app/models.py")], True),
+        (
+            [
+                file_event("/src/app/static/js/main.js"),
+                file_event("/src/app/views.py"),
+            ],
+            True,
+        ),
+    ],
+)
+def test_requires_collect(server, changes, expected):
+    assert server.requires_collect(changes) is expected
+
+
+@pytest.mark.parametrize(
+    "compose,expected",
+    [
+        ("services:\n  django: {}\n  db: {}\n", ["django", "db"]),
+        ("services:\n  django:\n    image: python\n", ["django"]),
+        ("include:\n  - other.yml\nservices:\n  django: {}\n", None),
+        ("services:\n  django:\n    extends: base\n", None),
+        ("services:\n  django:\n    profiles: [dev]\n", None),
+        ("services: []\n", None),
+        ("services: [\n", None),
+        ("", None),
+    ],
+)
+def test_get_docker_compose_services_from_file(server, compose, expected):
+    pytest.importorskip("yaml")
+    touch(server.docker_compose_path, compose)
+    assert server._get_docker_compose_services_from_file() == expected
+
+
+def test_get_docker_compose_services_from_file_missing(server):
+    assert server._get_docker_compose_services_from_file() is None
+
+
+@pytest.fixture
+def pypi(monkeypatch, server):
+    """Fake PyPI with a newer version, returns the shown messages"""
+
+    class Response:
+        status = 200
+
+        def read(self):
+            return json.dumps({"info": {"version": "999.0.0"}}).encode()
+
+        def getheader(self, name, default=None):
+            return '"etag"'
+
+    class Connection:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def request(self, *args, **kwargs):
+            pass
+
+        def getresponse(self):
+            return Response()
+
+    messages = []
+    monkeypatch.setattr("http.client.HTTPSConnection", Connection)
+    server.loop = SimpleNamespace(call_soon_threadsafe=lambda f, *args: f(*args))
+    server.show_message = messages.append
+    return messages
+
+
+def test_check_version_stored_per_user(server, pypi, monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    server._check_version()
+
+    assert len(pypi) == 1
+    assert "999.0.0" in pypi[0]
+    with open(tmp_path / "cache" / "djlsp" / "version-check.json") as fp:
+        assert json.load(fp) == {"etag": '"etag"', "version": "999.0.0"}
+
+
+def test_check_version_store_failure_still_shows_message(
+    server, pypi, monkeypatch, tmp_path
+):
+    # Cache home is a file, so the check can't be stored
+    touch(str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    server._check_version()
+
+    assert len(pypi) == 1
+
+
+def test_completions_skip_lines_without_brace(server):
+    uri = open_document(server, "<div class='content'>\n")
+
+    result = complete(server, uri, 0, 10)
+    assert result.items == []
+    assert result.is_incomplete is False
+    assert server.template_parsers == {}
+
+
+def test_completions_after_brace(server):
+    uri = open_document(server, "<div>{% \n{{ value|\n")
+
+    tags = [item.label for item in complete(server, uri, 0, 8).items]
+    assert "block" in tags
+    assert "for" in tags
+
+    filters = [item.label for item in complete(server, uri, 1, 9).items]
+    assert "date" in filters
+    assert uri in server.template_parsers
+
+
+def test_completions_limited(server):
+    builtins = FALLBACK_DJANGO_DATA["libraries"]["__builtins__"]
+    server.workspace_index.update(
+        {
+            "libraries": {
+                "__builtins__": {
+                    "tags": {
+                        **builtins["tags"],
+                        **{f"tag_{index:02}": {} for index in range(60)},
+                    },
+                    "filters": builtins["filters"],
+                },
+            },
+            "global_template_context": {
+                f"variable_{index:02}": None for index in range(60)
+            },
+        }
+    )
+    uri = open_document(server, "{{ \n{% for item in items %}\n{% ")
+
+    result = complete(server, uri, 0, 3)
+    assert len(result.items) == MAX_COMPLETION_ITEMS
+    assert result.is_incomplete is True
+
+    result = complete(server, uri, 2, 3)
+    assert len(result.items) == MAX_COMPLETION_ITEMS
+    assert result.is_incomplete is True
+    # Closing tags of open blocks sort first and survive the cut
+    assert [item.label for item in result.items[:2]] == ["empty", "endfor"]
+
+
+def test_completions_not_limited(server):
+    uri = open_document(server, "{{ \n")
+    server.workspace_index.update(
+        {"global_template_context": {"first": None, "second": None}}
+    )
+
+    result = complete(server, uri, 0, 3)
+    assert [item.label for item in result.items] == ["first", "second"]
+    assert result.is_incomplete is False
+
+
+def test_template_parser_reused_for_same_version(server):
+    uri = open_document(server, "{% ")
+    assert server.get_template_parser(uri) is server.get_template_parser(uri)
+
+
+def test_template_parser_rebuilt_after_change(server):
+    uri = open_document(server, "{% ")
+    template_parser = server.get_template_parser(uri)
+
+    change_document(server, uri, "{{ ")
+    changed_parser = server.get_template_parser(uri)
+    assert changed_parser is not template_parser
+    assert changed_parser.lines == ["{{ "]
+    assert server.get_template_parser(uri) is changed_parser
+
+
+def test_template_parser_oldest_evicted(server):
+    uris = [open_document(server, "{% ", f"page_{index}.html") for index in range(9)]
+    template_parsers = [server.get_template_parser(uri) for uri in uris]
+
+    assert len(server.template_parsers) == 8
+    assert uris[0] not in server.template_parsers
+    assert server.get_template_parser(uris[0]) is not template_parsers[0]
+    assert server.get_template_parser(uris[8]) is template_parsers[8]
+
+
+def create_django_data(**kwargs):
+    return {
+        "libraries": {"__builtins__": {}},
+        "templates": {},
+        "static_files": [],
+        "urls": {},
+        "global_template_context": {},
+        **kwargs,
+    }
+
+
+def test_template_parser_invalidated_by_django_data(server):
+    django_data = create_django_data(global_template_context={"first": None})
+    server._load_django_data = lambda: django_data
+    server.loop.run_until_complete(server.get_django_data())
+
+    uri = open_document(server, "{{ \n")
+    template_parser = server.get_template_parser(uri)
+    assert [item.label for item in complete(server, uri, 0, 3).items] == ["first"]
+
+    django_data["global_template_context"] = {"second": None}
+    server.loop.run_until_complete(server.get_django_data())
+
+    assert server.template_parsers == {}
+    assert server.get_template_parser(uri) is not template_parser
+    assert [item.label for item in complete(server, uri, 0, 3).items] == ["second"]
+
+
+@pytest.fixture
+def load_calls(server):
+    """Count collects, the collect takes 50ms"""
+    calls = []
+
+    def load_django_data():
+        calls.append(True)
+        time.sleep(0.05)
+        return create_django_data()
+
+    server._load_django_data = load_django_data
+    return calls
+
+
+def wait_for_collects(server, seconds=0.1):
+    server.loop.run_until_complete(asyncio.sleep(seconds))
+    while server.collect_tasks:
+        server.loop.run_until_complete(
+            asyncio.wait(server.collect_tasks, return_when=asyncio.ALL_COMPLETED)
+        )
+
+
+def test_schedule_django_data_debounced(server, load_calls):
+    for _ in range(5):
+        server.schedule_django_data(delay=0.01)
+
+    wait_for_collects(server)
+    assert len(load_calls) == 1
+    assert not server.collect_tasks
+
+
+def test_schedule_django_data_queued_once_during_collect(server, load_calls):
+    server.schedule_django_data(delay=0)
+    # First collect is running, later changes queue a single collect
+    server.loop.run_until_complete(asyncio.sleep(0.02))
+    for _ in range(3):
+        server.schedule_django_data(delay=0)
+        server.loop.run_until_complete(asyncio.sleep(0.005))
+
+    wait_for_collects(server)
+    assert len(load_calls) == 2
+
+
+def test_schedule_django_data_logs_exceptions(server, caplog):
+    def load_django_data():
+        raise RuntimeError("Collect failed")
+
+    server._load_django_data = load_django_data
+    server.schedule_django_data(delay=0)
+    wait_for_collects(server)
+
+    assert not server.collect_tasks
+    assert "Could not collect Django data: Collect failed" in caplog.text